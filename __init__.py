@@ -22,16 +22,33 @@ from importlib import reload
 
 from . import (
     create_pose_library,
+    library_api,
+    library_diagnostics,
+    library_shards,
     mirror_pose,
     library_template_UI,
+    live_library,
     message_box,
+    pose_cache,
+    pose_duplicates,
+    pose_previews,
+    pose_search,
+    rig_topology,
 )
 
 classes = [
+    rig_topology,
+    pose_cache,
     library_template_UI,
     create_pose_library,
+    library_diagnostics,
+    library_shards,
+    live_library,
     mirror_pose,
     message_box,
+    pose_duplicates,
+    pose_previews,
+    pose_search,
 ]
 
 for cls in classes:
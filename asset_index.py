@@ -0,0 +1,105 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import bpy
+
+
+# Custom property tagging generated actions with the category and pose they came from
+ORIGIN_KEY = "pose_library_origin"
+
+# Generated action names, keyed by category ID and then pose ID
+_index = {}
+
+
+def asset_name(category_name, pose_name):
+    """Returns the name of the asset generated for a pose"""
+    return f"{category_name} - {pose_name}"
+
+def make_origin(category_uid, pose_uid):
+    return f"{category_uid}/{pose_uid}"
+
+def split_origin(origin):
+    category_uid, _, pose_uid = origin.partition("/")
+    return category_uid, pose_uid
+
+def rebuild():
+    """Index every generated action in the file by its origin"""
+    _index.clear()
+    for action in bpy.data.actions:
+        origin = action.get(ORIGIN_KEY)
+        if origin:
+            category_uid, pose_uid = split_origin(origin)
+            _index.setdefault(category_uid, {})[pose_uid] = action.name
+
+def add(action, origin):
+    """Tag a generated action with its origin and index it"""
+    action[ORIGIN_KEY] = origin
+    category_uid, pose_uid = split_origin(origin)
+    _index.setdefault(category_uid, {})[pose_uid] = action.name
+
+def find(category_uid, pose_uid):
+    """Returns the action generated for a pose, or None"""
+    for attempt in range(2):
+        name = _index.get(category_uid, {}).get(pose_uid)
+        action = bpy.data.actions.get(name) if name else None
+        if action and action.get(ORIGIN_KEY) == make_origin(category_uid, pose_uid):
+            return action
+
+        # the index is out of date, read it again once
+        if attempt == 0:
+            rebuild()
+    return None
+
+def category_actions(category_uid):
+    """Returns the generated actions of a category, from the index as it is"""
+    actions = []
+    for name in _index.get(category_uid, {}).values():
+        action = bpy.data.actions.get(name)
+        if action and action.get(ORIGIN_KEY):
+            actions.append(action)
+    return actions
+
+def rename_pose(marker, pose):
+    """Rename the action generated for a pose to match its category and pose names.
+
+    Returns True if an action was renamed."""
+    if not marker.category_uid or not pose.uid:
+        return False
+
+    action = find(marker.category_uid, pose.uid)
+    if not action:
+        return False
+
+    new_name = asset_name(marker.name, pose.name)
+    if action.name == new_name:
+        return False
+
+    action.name = new_name
+    _index[marker.category_uid][pose.uid] = action.name
+    return True
+
+def rename_category(marker):
+    """Rename the actions generated for every pose of a category, from the index as it is.
+
+    Rebuild the index first if it may be out of date.
+    Returns the number of actions renamed."""
+    # categories that were never built have nothing to rename
+    poses = _index.get(marker.category_uid)
+    if not poses:
+        return 0
+
+    renamed = 0
+    for pose in marker.poses:
+        action = bpy.data.actions.get(poses.get(pose.uid, ""))
+        if not action or action.get(ORIGIN_KEY) != make_origin(marker.category_uid, pose.uid):
+            continue
+
+        new_name = asset_name(marker.name, pose.name)
+        if action.name != new_name:
+            action.name = new_name
+            poses[pose.uid] = action.name
+            renamed += 1
+    return renamed
+
+def clear():
+    _index.clear()
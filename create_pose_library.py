@@ -2,44 +2,178 @@
 # SPDX-License-Identifier: MIT
 
 import bpy
-import ast
-import re
-
+import tracemalloc
 
+import numpy as np
+from bpy.props import BoolProperty, EnumProperty, FloatProperty, IntProperty, StringProperty
 from pose_library import pose_creation
 
+from . import asset_index, library_core, library_shards, library_template_UI, pose_cache, rig_topology
+
+
+# Value of each channel in the rest pose
+REST = {
+    'location': (0.0, 0.0, 0.0),
+    'rotation_quaternion': (1.0, 0.0, 0.0, 0.0),
+    'rotation_euler': (0.0, 0.0, 0.0),
+    'rotation_axis_angle': (0.0, 0.0, 1.0, 0.0),
+    'scale': (1.0, 1.0, 1.0),
+}
+
 class PoseLibrary_Create(bpy.types.Operator):
     """Create Pose Library"""
     bl_idname = "pose.create_pose_library"
     bl_label = "Create Pose Library"
     bl_options = {'REGISTER'}
 
+    scope: EnumProperty(
+        name = "Scope",
+        items = (('ALL', 'All Poses', "Build every pose of every category"),
+                 ('CATEGORY', 'Active Category', "Only build the poses of the active category"),
+                 ('POSE', 'Active Pose', "Only build the active pose"),
+                 ('CATEGORIES', 'Categories', "Only build the categories named in Categories"),
+                 ('FRAMES', 'Frame Range', "Only build the poses whose frames are in the frame range")),
+        default = 'ALL',
+        options = {'SKIP_SAVE'}
+    )
+
+    categories: StringProperty(
+        name = "Categories",
+        description = "Comma separated category names to build, used by the Categories scope.",
+        default = "",
+        options = {'SKIP_SAVE'}
+    )
+
+    frame_start: IntProperty(
+        name = "Start Frame",
+        description = "First frame to build, used by the Frame Range scope.",
+        default = 0,
+        options = {'SKIP_SAVE'}
+    )
+
+    frame_end: IntProperty(
+        name = "End Frame",
+        description = "Last frame to build, used by the Frame Range scope.",
+        default = 0,
+        options = {'SKIP_SAVE'}
+    )
+
+    report_memory: BoolProperty(
+        name = "Report Memory",
+        description = "Track the peak Python memory used by each category. Makes the build slower.",
+        default = False,
+        options = {'SKIP_SAVE'}
+    )
+
+    sparse: BoolProperty(
+        name = "Sparse Poses",
+        description = "Leave out the channels of each pose that are the same as the reference pose",
+        default = False,
+        options = {'SKIP_SAVE'}
+    )
+
+    sparse_reference: EnumProperty(
+        name = "Reference",
+        items = (('REST', 'Rest Pose', "Leave out the channels at their rest value"),
+                 ('NEUTRAL', 'Neutral Pose', "Leave out the channels the same as the category's .neutral pose, or at rest if it has none")),
+        default = 'NEUTRAL',
+        options = {'SKIP_SAVE'}
+    )
+
+    sparse_tolerance: FloatProperty(
+        name = "Tolerance",
+        description = "Largest difference from the reference for a channel to be left out",
+        default = 0.0001,
+        min = 0.0,
+        precision = 5,
+        options = {'SKIP_SAVE'}
+    )
+
+    previews: BoolProperty(
+        name = "Render Previews",
+        description = "Render a preview of each pose from its category camera after building. Unchanged poses reuse their cached preview.",
+        default = False,
+        options = {'SKIP_SAVE'}
+    )
+
+    shards: BoolProperty(
+        name = "Write Category Files",
+        description = "Write the poses of each category built to a .blend file of its own, with a catalog per category",
+        default = False,
+        options = {'SKIP_SAVE'}
+    )
+
+    shard_dir: StringProperty(
+        name = "Folder",
+        description = "Folder to write the category files to",
+        default = "//pose_library",
+        subtype = 'DIR_PATH',
+        options = {'SKIP_SAVE'}
+    )
+
+    quiet: BoolProperty(
+        name = "Quiet",
+        description = "Report the result in the status bar instead of a message box",
+        default = False,
+        options = {'HIDDEN', 'SKIP_SAVE'}
+    )
+
     @classmethod
     def poll(cls, context):
         # only work if in POSE mode and you have a bone selected.
         return (context.mode == 'POSE' and context.active_pose_bone != None)
 
-    def getPoses(self, context):
-        markers = context.scene.timeline_markers
-
-        self.poses = []
-        for m, marker in enumerate(markers):
-            pose_list = marker.poses
-
-            for p, pose in enumerate(pose_list):
-                self.poses.append({
-                    'marker_index': m,
-                    'marker_name': marker.name,
-                    'marker_frame': marker.frame,
-                    'marker_ignore': ast.literal_eval(marker.ignore), # convert string to array
-                    'marker_layers': ast.literal_eval(marker.layers), # convert string to array
-                    'marker_mirror': marker.mirror,
-                    'pose_index': p,
-                    'pose_name': pose.name,
-                    'pose_frame': marker.frame + p,
-                    'pose_description': pose.description,
-                    'pose_skip': pose.skip
-                })
+    def getCategories(self, context):
+        """Yields each category, one at a time, so only one category's poses exist at once"""
+        scene = context.scene
+        markers = scene.timeline_markers
+
+        # leave out the categories outside of the scope, before reading their poses
+        for m, marker in library_core.select_categories(markers, self.scope, scene.category_active_index,
+                library_core.parse_names(self.categories), self.frame_end):
+            category = library_template_UI.category_record(marker)
+
+            yield {
+                'marker_index': m,
+                'marker_uid': library_template_UI.get_uid(marker, 'category_uid'),
+                'marker_name': marker.name,
+                'marker_frame': marker.frame,
+                'marker_ignore': category.ignore,
+                'marker_layers': category.layers,
+                'marker_mirror': marker.mirror,
+                'poses': self.getPoses(marker, category, scene.pose_increments)
+            }
+
+    def getPoses(self, marker, category, pose_increments):
+        """Yields the poses of a category"""
+        # leave out the poses outside of the scope
+        for p, pose, frame in library_core.select_poses(category, self.scope, pose_increments,
+                self.frame_start, self.frame_end):
+
+            yield {
+                'pose_index': p,
+                'pose_uid': library_template_UI.get_uid(marker.poses[p], 'uid'),
+                'pose_name': pose.name,
+                'pose_frame': frame,
+                'pose_description': pose.description,
+                'pose_skip': pose.skip
+            }
+
+    def getOrigins(self, context):
+        """Returns the origin of every pose in the template of every scene, skipped or not.
+
+        Other scenes' templates are included, so building one scene doesn't
+        remove the poses generated by another."""
+        origins = set()
+        for scene in bpy.data.scenes:
+            for marker in scene.timeline_markers:
+                # categories and poses without an ID were never built
+                if not marker.category_uid:
+                    continue
+                for pose in marker.poses:
+                    if pose.uid:
+                        origins.add(asset_index.make_origin(marker.category_uid, pose.uid))
+        return origins
 
     def getSelectedArmature(self, context):
         try:
@@ -75,11 +209,9 @@ class PoseLibrary_Create(bpy.types.Operator):
 
         pose = bpy.ops.pose
 
-        # clear selection
-        pose.select_all(action='DESELECT')
-
-        # select all bones on the mirrored side
-        bpy.ops.object.select_pattern(pattern=f'*[{mirror}]')
+        # select all visible bones on the mirrored side, clearing the rest
+        topology = rig_topology.get_topology(self.arm)
+        rig_topology.set_selection(self.arm, topology.side(mirror, topology.visible(self.arm)))
 
         # copy the pose
         pose.copy()
@@ -101,97 +233,242 @@ class PoseLibrary_Create(bpy.types.Operator):
 
     def deselectIgnoredBones(self,  ignore_bones):
 
-        selected_pose_bones = bpy.context.selected_pose_bones
-
-        for bone in selected_pose_bones:
-            # check if the name matches ignore_bones
-            # if so, deselect it
-
-            name = bone.name
+        # find the bones whose names match ignore_bones,
+        # if they are selected, deselect them
+        topology = rig_topology.get_topology(self.arm)
+        bones = self.arm.bones
 
-            for ignore in ignore_bones:
-                if bool(re.fullmatch(ignore, name)):
-                    bone.bone.select=False
-                    print(f'Ignoring: {name}')
+        for i in topology.matching(ignore_bones):
+            bone = bones[int(i)]
+            if bone.select:
+                bone.select = False
+                print(f'Ignoring: {bone.name}')
 
     def createLibPoses(self, context):
 
         self.poses_new = 0
         self.poses_failed = 0
         self.poses_skipped = 0
+        self.category_memory = []
+        self.channels_dropped = 0
+        self.references = {}
 
-        for i, item in enumerate(self.poses):
-            prefix = item['marker_name']
-            layers = item['marker_layers']
-            mirror = item['marker_mirror']
-            ignore_bones = item['marker_ignore']
-            frame = item['pose_frame']
-            name = item['pose_name']
-            description = item['pose_description']
-            skip = item['pose_skip']
-
-            if skip:
-                self.poses_skipped += 1
-                continue
-            # set the layers for the specified pose
-            self.setPoseLayers(layers)
-
-            # select the controls in the layers
-            bpy.ops.pose.select_all(action='SELECT')
+        # look up existing actions by name from one snapshot, instead of
+        # listing every action name for every pose
+        self.actions = {action.name: action for action in bpy.data.actions}
+        self.built = {}
 
-            # Deselect the controls that are to be ignored
-            if len(ignore_bones) > 0:
-                self.deselectIgnoredBones(ignore_bones)
+        if self.report_memory:
+            tracemalloc.start()
 
-            # Set the frame
-            #self.report({'INFO'},  (f"Setting frame to {frame}"))
-            context.scene.frame_set(int(frame))
-            new_name = (f"{prefix} - {name}")
-
-            # delete the existing pose asset if it already exists
-            if new_name in bpy.data.actions.keys():
-                print(f'Pose exists: {new_name}. Deleting...')
-                action = bpy.data.actions[new_name]
-                bpy.data.actions.remove(action)
+        try:
+            for category in self.getCategories(context):
+                for item in category['poses']:
+                    self.createLibPose(context, category, item)
+
+                if self.report_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    self.category_memory.append((category['marker_name'], peak))
+                    print(f"{category['marker_name']}: peak memory {peak / 1024:.1f} KB")
+                    tracemalloc.reset_peak()
+        finally:
+            if self.report_memory:
+                tracemalloc.stop()
+
+    def createLibPose(self, context, category, item):
+        prefix = category['marker_name']
+        layers = category['marker_layers']
+        mirror = category['marker_mirror']
+        ignore_bones = category['marker_ignore']
+        frame = item['pose_frame']
+        name = item['pose_name']
+        description = item['pose_description']
+        skip = item['pose_skip']
+
+        if skip:
+            self.poses_skipped += 1
+            return
+        # set the layers for the specified pose
+        self.setPoseLayers(layers)
+
+        # select the controls in the layers
+        bpy.ops.pose.select_all(action='SELECT')
+
+        # Deselect the controls that are to be ignored
+        if len(ignore_bones) > 0:
+            self.deselectIgnoredBones(ignore_bones)
+
+        # Set the frame
+        #self.report({'INFO'},  (f"Setting frame to {frame}"))
+        context.scene.frame_set(int(frame))
+        new_name = asset_index.asset_name(prefix, name)
+
+        # delete the existing pose asset if it already exists
+        action = self.actions.pop(new_name, None)
+        if action:
+            print(f'Pose exists: {new_name}. Deleting...')
+            bpy.data.actions.remove(action)
+
+        # if mirror is not none, we'll need to copy poses from the mirror side
+        # to the other side.
+        if mirror not in ("", "NONE"):
+            self.mirrorPose(context,mirror)
+
+        # create the pose
+        try:
+            new_pose = pose_creation.create_pose_asset_from_context(context, new_name)
+            new_pose.asset_data.description = description
+
+            # remember where it came from, so it can be found again when renamed or removed
+            origin = asset_index.make_origin(category['marker_uid'], item['pose_uid'])
+            asset_index.add(new_pose, origin)
+            self.actions[new_pose.name] = new_pose
+
+            # the neutral pose would leave out everything compared with itself
+            if self.sparse and not (self.sparse_reference == 'NEUTRAL' and name == ".neutral"):
+                self.channels_dropped += self.sparsePose(new_pose, self.getReference(context, category))
+            self.built[origin] = new_pose
+            self.poses_new += 1
+        except:
+            self.poses_failed += 1
+
+
+    def getReference(self, context, category):
+        """Returns the .neutral pose of a category by F-Curve path and index, worked out once per category"""
+        if self.sparse_reference != 'NEUTRAL':
+            return {}
+
+        uid = category['marker_uid']
+        if uid not in self.references:
+            scene = context.scene
+            marker = scene.timeline_markers[category['marker_index']]
+            names = [pose.name for pose in marker.poses]
+
+            reference = {}
+            entry = None
+            if ".neutral" in names:
+                entry = pose_cache.get_category_poses(context.pose_object, marker, scene.pose_increments)
+            if entry:
+                row = entry.values[names.index(".neutral")]
+                for bone, prop, columns in entry.groups:
+                    path = f'pose.bones["{bone}"].{prop}'
+                    for index, column in columns:
+                        reference[(path, index)] = row[column]
+            self.references[uid] = reference
+
+        return self.references[uid]
+
+    def sparsePose(self, action, reference):
+        """Remove the channels of a pose asset that are the same as the reference.
+
+        A property is only removed when all of its channels are the same, so a
+        rotation is never left with some of its components. Channels the
+        reference doesn't have are compared with the rest pose.
+        Returns the number of channels removed."""
+        fcurves = [fcurve for fcurve in action.fcurves if len(fcurve.keyframe_points)]
+        if not fcurves:
+            return 0
+
+        values = np.empty(len(fcurves), dtype=np.float32)
+        targets = np.full(len(fcurves), np.nan, dtype=np.float32)
+        for i, fcurve in enumerate(fcurves):
+            values[i] = fcurve.keyframe_points[0].co[1]
+
+            key = (fcurve.data_path, fcurve.array_index)
+            if key in reference:
+                targets[i] = reference[key]
+                continue
 
-            # if mirror is not none, we'll need to copy poses from the mirror side
-            # to the other side.
-            if mirror != "":
-                self.mirrorPose(context,mirror)
+            match = pose_cache.BONE_PATH.match(fcurve.data_path)
+            if match and match.group(2) in REST:
+                targets[i] = REST[match.group(2)][fcurve.array_index]
+
+        # channels with nothing to compare with are kept, since nan never matches
+        same = np.abs(values - targets) <= self.sparse_tolerance
+
+        # keep every channel of a property if any of them differs
+        paths, properties = np.unique([fcurve.data_path for fcurve in fcurves], return_inverse=True)
+        differs = np.bincount(properties, weights=~same, minlength=len(paths)) > 0
+        removed = np.flatnonzero(~differs[properties])
+        for i in removed:
+            action.fcurves.remove(fcurves[int(i)])
+        return len(removed)
+
+    def pruneActions(self, context):
+        """Remove the generated actions of poses that were renamed or removed, all at once"""
+        origins = self.getOrigins(context)
+
+        stale = []
+        for action in bpy.data.actions:
+            origin = action.get(asset_index.ORIGIN_KEY)
+            if origin == None:
+                continue
 
-            # create the pose
-            try:
-                new_pose = pose_creation.create_pose_asset_from_context(context, new_name)
-                new_pose.asset_data.description = description
-                self.poses_new += 1
-            except:
-                self.poses_failed += 1
+            # the pose is gone, or it was rebuilt under another name
+            built = self.built.get(origin)
+            if origin not in origins or (built and built != action):
+                stale.append(action)
 
+        self.pruned = [action.name for action in stale]
+        if stale:
+            bpy.data.batch_remove(stale)
+            asset_index.rebuild()
 
     def execute(self, context):
 
-        # get all the poses specified
-        self.getPoses(context)
-
         # get the selected armature
         self.getSelectedArmature(context)
 
         # store the current layers
         self.storeCurrentLayers()
 
-        # create poses
-        self.createLibPoses(context)
+        # create poses, without the selection following the frames
+        with library_template_UI.suspend_updates(refresh=False):
+            self.createLibPoses(context)
+
+        # remove the poses that no longer exist
+        self.pruneActions(context)
 
         # reset the current layers
         self.setPoseLayers(self.layersOn)
 
+        # render the previews of the new poses
+        if self.previews:
+            bpy.ops.pose.render_previews()
+
+        # write the files of the categories that were built
+        if self.shards:
+            folder = library_shards.get_shard_dir(self.shard_dir)
+            if folder == None:
+                self.report({'WARNING'}, "The category files weren't written. Save the file first.")
+            else:
+                # a full build writes every category, and removes the files of deleted ones
+                category_uids = None
+                if self.scope != 'ALL':
+                    category_uids = {asset_index.split_origin(origin)[0] for origin in self.built}
+                library_shards.write_shards(context.scene, folder, category_uids)
+
         # return result
         message = "you have updated the pose library.\n\n"
         message += (f"{self.poses_new} pose(s) created successfully.\n")
         message += (f"{self.poses_failed} pose(s) failed.\n")
         message += (f"{self.poses_skipped} poses(s) skipped.\n")
-        bpy.ops.wm.message_box('INVOKE_DEFAULT',
-            message = message)
+        message += (f"{len(self.pruned)} old pose(s) removed.\n")
+        if self.sparse:
+            message += (f"{self.channels_dropped} unchanged channel(s) left out.\n")
+        for name in self.pruned[:10]:
+            message += (f"  - {name}\n")
+        if len(self.pruned) > 10:
+            message += (f"  ...and {len(self.pruned) - 10} more.\n")
+        if self.category_memory:
+            message += "\nPeak memory per category:\n"
+            for name, peak in self.category_memory:
+                message += (f"{name}: {peak / 1024:.1f} KB\n")
+        if self.quiet:
+            self.report({'INFO'}, f"{self.poses_new} pose(s) created, {self.poses_failed} failed.")
+        else:
+            bpy.ops.wm.message_box('INVOKE_DEFAULT',
+                message = message)
         return {'FINISHED'}
 
 classes = [
@@ -0,0 +1,145 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+"""
+Python API for building pose library templates from scripts.
+
+Changes are made straight on the scene's markers, with the update callbacks
+suspended, and the categories are laid out on their frames once at the end.
+
+    # the package is the folder the add-on is installed in
+    from pose_library_template import library_api
+
+    library_api.add_categories([
+        {'name': "Hands", 'mirror': 'L', 'layers': [4, 5], 'poses': ["fist", "point"]},
+        {'name': "Face", 'ignore': ["Iris*"]},
+    ])
+    library_api.add_poses("Face", [{'name': "happy", 'description': "Big smile"}, "sad"])
+    library_api.reorder(["Face", "Hands"])
+    library_api.build(scope='CATEGORIES', categories=["Face"])
+"""
+
+import bpy
+
+from . import library_template_UI
+
+
+def get_category(scene, category):
+    """Returns the marker of a category, from the marker itself or its name"""
+    if isinstance(category, str):
+        for marker in scene.timeline_markers:
+            if marker.name == category:
+                return marker
+        raise KeyError(f"There is no category named {category}.")
+    return category
+
+def add_pose(marker, spec):
+    """Add a pose from a name or a dict with name, description and skip"""
+    if isinstance(spec, str):
+        spec = {'name': spec}
+
+    pose = marker.poses.add()
+    pose.name = spec['name']
+    pose.description = spec.get('description', "")
+    pose.skip = spec.get('skip', False)
+    library_template_UI.get_uid(pose, 'uid')
+    return pose
+
+def add_categories(specs, scene=None):
+    """Add categories at the end of the list, in one go.
+
+    Each spec is a dict with a name, and optionally layers and ignore (lists),
+    mirror ('NONE', 'L' or 'R'), camera (an object name, the scene camera if
+    left out), neutral (add a .neutral pose first, the scene setting if left
+    out) and poses (names or pose dicts, see add_poses).
+    Returns the new markers."""
+    scene = scene or bpy.context.scene
+    markers = scene.timeline_markers
+
+    library_template_UI.ensure_category_order(scene)
+
+    added = []
+    with library_template_UI.suspend_updates():
+        for spec in specs:
+            order = len(markers)
+            marker = markers.new(name=spec['name'], frame=library_template_UI.category_frame(scene, order))
+            marker.category_order = order
+            library_template_UI.get_uid(marker, 'category_uid')
+
+            if 'layers' in spec:
+                marker.layers = str(list(spec['layers']))
+            marker.ignore = str(list(spec.get('ignore', [])))
+            marker.mirror = spec.get('mirror', 'NONE')
+
+            camera = bpy.data.objects.get(spec['camera']) if spec.get('camera') else scene.camera
+            if camera:
+                marker.camera_pointer = camera
+
+            if spec.get('neutral', scene.pose_include_neutral):
+                add_pose(marker, {'name': ".neutral", 'description': "Neutral pose."})
+            for pose_spec in spec.get('poses', []):
+                add_pose(marker, pose_spec)
+
+            added.append(marker)
+
+        library_template_UI.relayout_markers(scene)
+        library_template_UI.touch_library()
+    return added
+
+def add_poses(category, specs, scene=None):
+    """Add poses to the end of a category, in one go.
+
+    category is a marker or a category name. Each spec is a pose name or a
+    dict with name, and optionally description and skip.
+    Returns the new poses."""
+    scene = scene or bpy.context.scene
+    marker = get_category(scene, category)
+
+    with library_template_UI.suspend_updates():
+        added = [add_pose(marker, spec) for spec in specs]
+        library_template_UI.touch_library()
+    return added
+
+def reorder(order, scene=None):
+    """Put the categories in the order of a list of names.
+
+    Categories left out of the list keep their order, after the listed ones.
+    Every category is moved to its new frame at once."""
+    scene = scene or bpy.context.scene
+    ranks = {name: i for i, name in enumerate(order)}
+
+    markers = library_template_UI.get_ordered_markers(scene)
+    markers.sort(key=lambda marker: ranks.get(marker.name, len(ranks)))
+
+    with library_template_UI.suspend_updates():
+        for i, marker in enumerate(markers):
+            if marker.category_order != i:
+                marker.category_order = i
+        library_template_UI.relayout_markers(scene)
+        library_template_UI.touch_library()
+
+def build(scope='ALL', categories=(), frame_start=0, frame_end=0, **options):
+    """Build the pose library, or part of it, without a message box.
+
+    scope is one of the Create Pose Library scopes: 'ALL', 'CATEGORY', 'POSE',
+    'CATEGORIES' (the category names given, or one name) or 'FRAMES' (the
+    frame range).
+    Any other Create Pose Library option can be passed by name.
+    The rig has to be in pose mode."""
+    if isinstance(categories, str):
+        categories = [categories]
+
+    arguments = dict(options, scope=scope, categories=",".join(categories),
+        frame_start=frame_start, frame_end=frame_end, quiet=True)
+
+    context = bpy.context
+    if context.area and context.area.type == 'VIEW_3D':
+        return bpy.ops.pose.create_pose_library(**arguments)
+
+    # run from a script, so borrow a 3D view
+    window, area = library_template_UI.find_view3d(context)
+    if window == None:
+        raise RuntimeError("Building the pose library needs a 3D view.")
+
+    with context.temp_override(window=window, area=area):
+        return bpy.ops.pose.create_pose_library(**arguments)
@@ -0,0 +1,248 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+"""
+Template logic that doesn't need Blender.
+
+Categories and poses are plain records here, so frame layout, build planning,
+ignore matching, mirroring and the template file format can be tested and
+timed in plain Python, or handed to other processes. The Blender modules turn
+markers into records and back.
+"""
+
+import bisect
+import re
+
+
+# Side of a bone, from Blender's naming conventions: hand.L, hand_R, L.hand, r-hand...
+SIDE_SUFFIX = re.compile(r'^(?P<base>.+[._-])(?P<side>[LRlr])(?P<number>\.\d+)?$')
+SIDE_PREFIX = re.compile(r'^(?P<side>[LRlr])(?P<base>[._-].+)$')
+
+# Template file settings, and their values when a file leaves them out
+SETTINGS = {
+    "category_start_frame": 100,
+    "category_increments": 100,
+    "category_active_index": 0,
+    "category_activate_layers": True,
+    "category_hide_ignore": True,
+    "pose_increments": 1,
+    "pose_include_neutral": True,
+}
+
+
+class Pose():
+    """A pose of a category"""
+
+    __slots__ = ('name', 'description', 'skip', 'uid')
+
+    def __init__(self, name, description="", skip=False, uid=""):
+        self.name = name
+        self.description = description
+        self.skip = skip
+        self.uid = uid
+
+
+class Category():
+    """A category and its poses.
+
+    layers and ignore are lists, mirror is 'NONE', 'L' or 'R' and camera
+    is the name of the camera object."""
+
+    __slots__ = ('name', 'frame', 'order', 'uid', 'layers', 'ignore', 'mirror', 'camera', 'poses', 'active_pose')
+
+    def __init__(self, name, frame=0, order=0, uid="", layers=(), ignore=(), mirror='NONE', camera="",
+            poses=(), active_pose=0):
+        self.name = name
+        self.frame = frame
+        self.order = order
+        self.uid = uid
+        self.layers = list(layers)
+        self.ignore = list(ignore)
+        self.mirror = mirror
+        self.camera = camera
+        self.poses = list(poses)
+        self.active_pose = active_pose
+
+
+# -------------------------------------------------------------------
+#   Layout
+# -------------------------------------------------------------------
+
+def category_frame(start_frame, increments, order):
+    """Returns the frame of the category at the given place in the order"""
+    return order * increments + start_frame
+
+def pose_frame(category, pose_index, pose_increments):
+    return category.frame + pose_index * pose_increments
+
+def layout(categories, start_frame, increments):
+    """Put every category on the frame derived from its order.
+
+    Returns the categories that moved."""
+    moved = []
+    for category in categories:
+        frame = category_frame(start_frame, increments, category.order)
+        if category.frame != frame:
+            category.frame = frame
+            moved.append(category)
+    return moved
+
+def frame_index(categories):
+    """Returns the category frames in order and the index of each category"""
+    found = sorted((category.frame, c) for c, category in enumerate(categories))
+    return [frame for frame, c in found], [c for frame, c in found]
+
+def category_at(frames, frame):
+    """Returns the place in the sorted frames of the category a frame falls in, or -1 before the first"""
+    return bisect.bisect_right(frames, frame) - 1
+
+def find_pose(categories, frames, indexes, frame, pose_increments):
+    """Returns the category and pose index on a frame, or None if there isn't one"""
+    i = category_at(frames, frame)
+    if i < 0:
+        return None
+
+    category = categories[indexes[i]]
+    pose_index = (frame - category.frame) // max(1, pose_increments)
+    if pose_index >= len(category.poses):
+        return None
+    return indexes[i], pose_index
+
+
+# -------------------------------------------------------------------
+#   Build planning
+# -------------------------------------------------------------------
+
+def parse_names(text):
+    """Returns the names in a comma separated list"""
+    return {name.strip() for name in text.split(',') if name.strip()}
+
+def select_categories(categories, scope, active_index=0, names=(), frame_end=0):
+    """Yields the index of each category a build of the scope includes, and the category.
+
+    Only the name and frame of a category are read, so markers can be
+    passed as they are."""
+    for c, category in enumerate(categories):
+        if scope in {'CATEGORY', 'POSE'} and c != active_index:
+            continue
+        if scope == 'CATEGORIES' and category.name not in names:
+            continue
+        if scope == 'FRAMES' and category.frame > frame_end:
+            continue
+        yield c, category
+
+def select_poses(category, scope, pose_increments, frame_start=0, frame_end=0):
+    """Yields the index, pose and frame of each pose of a category a build of the scope includes"""
+    for p, pose in enumerate(category.poses):
+        frame = pose_frame(category, p, pose_increments)
+        if scope == 'POSE' and p != category.active_pose:
+            continue
+        if scope == 'FRAMES' and not (frame_start <= frame <= frame_end):
+            continue
+        yield p, pose, frame
+
+def plan_build(categories, scope, pose_increments, active_index=0, names=(), frame_start=0, frame_end=0):
+    """Returns the category index, pose index and frame of every pose to build, skipped ones left out"""
+    plan = []
+    for c, category in select_categories(categories, scope, active_index, names, frame_end):
+        for p, pose, frame in select_poses(category, scope, pose_increments, frame_start, frame_end):
+            if not pose.skip:
+                plan.append((c, p, frame))
+    return plan
+
+
+# -------------------------------------------------------------------
+#   Controls
+# -------------------------------------------------------------------
+
+def match_ignore(names, patterns):
+    """Returns the indices of the names that fully match one of the regular expressions"""
+    compiled = [re.compile(pattern) for pattern in patterns]
+    return [i for i, name in enumerate(names) if any(pattern.fullmatch(name) for pattern in compiled)]
+
+def split_side(name):
+    """Returns the side of a bone name ('L', 'R' or None) and the name of the other side"""
+    match = SIDE_SUFFIX.match(name)
+    if match:
+        side = match.group('side')
+        flipped = match.group('base') + flip_side(side) + (match.group('number') or '')
+        return side.upper(), flipped
+
+    match = SIDE_PREFIX.match(name)
+    if match:
+        side = match.group('side')
+        return side.upper(), flip_side(side) + match.group('base')
+
+    return None, name
+
+def flip_side(side):
+    return {'L': 'R', 'R': 'L', 'l': 'r', 'r': 'l'}[side]
+
+def mirror_map(names):
+    """Returns the side of every name and the index of its mirrored name.
+
+    Names in the middle, or without a match on the other side, mirror onto themselves."""
+    index = {name: i for i, name in enumerate(names)}
+    sides = []
+    mirror = []
+    for i, name in enumerate(names):
+        side, flipped = split_side(name)
+        sides.append(side)
+        mirror.append(index.get(flipped, i) if side else i)
+    return sides, mirror
+
+def mirror_pairs(mirror):
+    """Returns the mirrored index of every index that has a bone on the other side.
+
+    Bones in the middle, and bones without a match, are left out, so they
+    are never flipped onto themselves."""
+    return {i: m for i, m in enumerate(mirror) if m != i}
+
+
+# -------------------------------------------------------------------
+#   Template files
+# -------------------------------------------------------------------
+
+def read_template(data):
+    """Returns the settings and categories of a template file.
+
+    Only the settings in the file are returned, the categories are laid out
+    with the default settings for the ones it leaves out."""
+    settings = dict(data.get('settings', {}))
+    start_frame = settings.get('category_start_frame', SETTINGS['category_start_frame'])
+    increments = settings.get('category_increments', SETTINGS['category_increments'])
+
+    categories = []
+    for order, entry in enumerate(data.get('poses', [])):
+        poses = [Pose(pose['name'], pose.get('description', "")) for pose in entry.get('pose', [])]
+        categories.append(Category(
+            entry['category'],
+            frame=category_frame(start_frame, increments, order),
+            order=order,
+            layers=entry.get('layers', []),
+            ignore=entry.get('ignore', []),
+            mirror=entry.get('mirror', 'NONE') or 'NONE',
+            camera=entry.get('camera', ""),
+            poses=poses))
+    return settings, categories
+
+def write_template(categories, settings, info):
+    """Returns the template file data of categories, in their order"""
+    entries = []
+    for index, category in enumerate(sorted(categories, key=lambda category: category.order)):
+        entries.append({
+            "index"     : index,
+            "category"  : category.name,
+            "ignore"    : category.ignore,
+            "layers"    : category.layers,
+            "mirror"    : category.mirror,
+            "camera"    : category.camera,
+            "pose"      : [{'index': p, 'name': pose.name, 'description': pose.description}
+                for p, pose in enumerate(category.poses)],
+        })
+
+    return {
+        'info': info,
+        'settings': {name: settings[name] for name in SETTINGS if name in settings},
+        'poses': entries,
+    }
@@ -0,0 +1,173 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import tracemalloc
+
+import bpy
+from bpy.types import Operator
+from bpy.props import BoolProperty, IntProperty
+
+from . import asset_index, library_template_UI
+
+
+# Datablock types counted in the report
+DATABLOCKS = ('actions', 'objects', 'armatures', 'cameras', 'meshes', 'materials', 'images', 'collections')
+
+# Approximate size of a keyframe (a BezTriple) in a .blend file
+KEY_BYTES = 72
+
+
+def snapshot():
+    """Returns the datablock counts, the keys of every action, the category each
+    generated action came from and the number of orphans"""
+    data = bpy.data
+
+    counts = {name: len(getattr(data, name)) for name in DATABLOCKS}
+
+    actions = {}
+    origins = {}
+    for action in data.actions:
+        fcurves = action.fcurves
+        actions[action.name] = (len(fcurves), sum(len(fcurve.keyframe_points) for fcurve in fcurves))
+
+        origin = action.get(asset_index.ORIGIN_KEY)
+        if origin:
+            origins[action.name] = asset_index.split_origin(origin)[0]
+
+    orphans = 0
+    for name in DATABLOCKS:
+        for block in getattr(data, name):
+            if block.users == 0:
+                orphans += 1
+
+    heap = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    return {
+        'counts': counts,
+        'actions': actions,
+        'origins': origins,
+        'orphans': orphans,
+        'heap': heap,
+    }
+
+def action_keys(actions):
+    return sum(keys for fcurves, keys in actions.values())
+
+def category_keys(state, categories):
+    """Returns the number of keys in the generated actions of each category, by category ID"""
+    totals = {uid: 0 for uid, name in categories}
+    origins = state['origins']
+    for name, (fcurves, keys) in state['actions'].items():
+        uid = origins.get(name)
+        if uid in totals:
+            totals[uid] += keys
+    return totals
+
+def size(keys):
+    return f"{keys * KEY_BYTES / 1024:.1f} KB"
+
+
+class POSE_OT_LibraryFootprint(Operator):
+    """Report the datablocks and memory used by building the pose library"""
+    bl_idname = "pose.library_footprint"
+    bl_label = "Library Footprint Report"
+    bl_options = {'REGISTER'}
+
+    build: BoolProperty(
+        name = "Build Library",
+        description = "Build the pose library and report what changed. If off, only report the current file.",
+        default = True
+    )
+
+    top: IntProperty(
+        name = "Largest Actions",
+        description = "Number of the largest actions to list",
+        default = 5,
+        min = 0
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'POSE' and context.active_pose_bone != None)
+
+    def execute(self, context):
+        # the IDs the build will tag the actions with, and the names to show
+        categories = [(library_template_UI.get_uid(marker, 'category_uid'), marker.name)
+            for marker in context.scene.timeline_markers]
+
+        tracemalloc.start()
+        try:
+            before = snapshot()
+            if self.build:
+                bpy.ops.pose.create_pose_library()
+            after = snapshot()
+            heap_peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        lines = self.buildReport(before, after, heap_peak, categories)
+        message = "\n".join(lines)
+        print(message)
+
+        bpy.ops.wm.message_box('INVOKE_DEFAULT',
+            message = message,
+            title = "Library Footprint")
+        return {'FINISHED'}
+
+    def buildReport(self, before, after, heap_peak, categories):
+        lines = ["Datablocks:"]
+        for name in DATABLOCKS:
+            count = after['counts'][name]
+            delta = count - before['counts'][name]
+            lines.append(f"  {name}: {count} ({delta:+d})")
+
+        old_actions = before['actions']
+        new_actions = after['actions']
+        keys = action_keys(new_actions)
+        key_delta = keys - action_keys(old_actions)
+        fcurves = sum(fcurves for fcurves, k in new_actions.values())
+        fcurve_delta = fcurves - sum(fcurves for fcurves, k in old_actions.values())
+
+        lines.append("")
+        lines.append(f"F-Curves: {fcurves} ({fcurve_delta:+d})")
+        lines.append(f"Keyframes: {keys} ({key_delta:+d}), about {size(keys)}")
+        lines.append(f"Orphans: {after['orphans']} ({after['orphans'] - before['orphans']:+d})")
+        lines.append(f"Python heap: {(after['heap'] - before['heap']) / 1024:+.1f} KB, peak {heap_peak / 1024:.1f} KB")
+
+        # keys per category
+        old_categories = category_keys(before, categories)
+        new_categories = category_keys(after, categories)
+        lines.append("")
+        lines.append("Keyframes per category:")
+        for uid, name in sorted(categories, key=lambda c: new_categories[c[0]], reverse=True):
+            delta = new_categories[uid] - old_categories[uid]
+            lines.append(f"  {name}: {new_categories[uid]} ({delta:+d})")
+
+        # largest offenders
+        if self.top:
+            lines.append("")
+            lines.append("Largest actions:")
+            largest = sorted(new_actions.items(), key=lambda item: item[1][1], reverse=True)[:self.top]
+            for name, (fcurves, keys) in largest:
+                lines.append(f"  {name}: {keys} keys on {fcurves} F-Curves, about {size(keys)}")
+
+        return lines
+
+
+classes = [
+    POSE_OT_LibraryFootprint,
+]
+
+def register():
+
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+
+    classes.reverse()
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,179 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import os
+import re
+import uuid
+
+import bpy
+from bpy.types import Operator
+from bpy.props import EnumProperty, StringProperty
+
+from . import asset_index
+
+
+# Name Blender looks for when reading the catalogs of an asset library
+CATALOG_FILE = "blender_assets.cats.txt"
+
+# Catalog IDs are worked out from the category ID, so they stay the same between builds
+CATALOG_NAMESPACE = uuid.UUID("6f1c4f5e-8a3b-4f0e-9d42-6b7a2f1c9e30")
+
+# Shard files are named after a category ID, other files in the folder are the user's
+SHARD_NAME = re.compile(r"^(?P<uid>[0-9a-f]{32})\.blend$")
+
+
+def catalog_id(category_uid):
+    return str(uuid.uuid5(CATALOG_NAMESPACE, category_uid))
+
+def catalog_name(name):
+    """Catalog paths can't hold colons or slashes"""
+    return name.replace(":", "-").replace("/", "-").strip() or "Category"
+
+def shard_path(folder, marker):
+    """Files are named by category ID, so they can't clash and survive renames"""
+    return os.path.join(folder, f"{marker.category_uid}.blend")
+
+def get_shard_dir(path):
+    """Returns the folder to write the shards to, making it if needed.
+
+    Returns None for a relative path in a file that was never saved, since
+    there's no folder to be relative to."""
+    if path.startswith("//") and not bpy.data.filepath:
+        return None
+    folder = bpy.path.abspath(path)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def remove_stale_shards(folder):
+    """Remove the shards of categories that no longer exist in any scene.
+
+    Returns the paths removed."""
+    category_uids = {marker.category_uid for scene in bpy.data.scenes for marker in scene.timeline_markers}
+
+    removed = []
+    for name in os.listdir(folder):
+        match = SHARD_NAME.match(name)
+        if match and match.group('uid') not in category_uids:
+            path = os.path.join(folder, name)
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+def write_catalogs(folder, markers):
+    """Write the catalog definition file, one catalog per category"""
+    lines = [
+        "# This is an Asset Catalog Definition file for Blender.",
+        "#",
+        "# Empty lines and lines starting with `#` will be ignored.",
+        "# The first non-ignored line should be the version indicator.",
+        '# Other lines are of the format "UUID:catalog/path/for/assets:simple catalog name"',
+        "",
+        "VERSION 1",
+        "",
+    ]
+    for marker in markers:
+        if marker.category_uid:
+            name = catalog_name(marker.name)
+            lines.append(f"{catalog_id(marker.category_uid)}:{name}:{name}")
+
+    with open(os.path.join(folder, CATALOG_FILE), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def write_shards(scene, folder, category_uids=None):
+    """Write the generated actions of each category to a .blend of its own.
+
+    Only the categories in category_uids are written, or all of them if it
+    is None, in which case the shards of removed categories are deleted too.
+    The catalog file always lists every category.
+    Returns the paths written."""
+    asset_index.rebuild()
+
+    written = []
+    for marker in scene.timeline_markers:
+        if not marker.category_uid:
+            continue
+        if category_uids != None and marker.category_uid not in category_uids:
+            continue
+
+        actions = [action for action in asset_index.category_actions(marker.category_uid) if action.asset_data]
+        if not actions:
+            continue
+
+        # file the poses under their category's catalog
+        catalog = catalog_id(marker.category_uid)
+        for action in actions:
+            action.asset_data.catalog_id = catalog
+
+        path = shard_path(folder, marker)
+        bpy.data.libraries.write(path, set(actions), fake_user=True, compress=True)
+        written.append(path)
+
+    if category_uids == None:
+        remove_stale_shards(folder)
+
+    write_catalogs(folder, scene.timeline_markers)
+    return written
+
+
+class POSE_OT_WriteShards(Operator):
+    """Write the pose assets of each category to a .blend file of its own"""
+    bl_idname = "pose.write_library_shards"
+    bl_label = "Write Library Shards"
+    bl_options = {'REGISTER'}
+
+    scope: EnumProperty(
+        name = "Scope",
+        items = (('ALL', 'All Categories', "Write a file for every category"),
+                 ('CATEGORY', 'Active Category', "Only write the file of the active category")),
+        default = 'ALL'
+    )
+
+    directory: StringProperty(
+        name = "Folder",
+        description = "Folder to write the category files and the catalog file to. Add it as an asset library to browse them.",
+        default = "//pose_library",
+        subtype = 'DIR_PATH'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (len(context.scene.timeline_markers) > 0)
+
+    def execute(self, context):
+        scene = context.scene
+
+        category_uids = None
+        if self.scope == 'CATEGORY':
+            category_uids = {scene.timeline_markers[scene.category_active_index].category_uid}
+
+        folder = get_shard_dir(self.directory)
+        if folder == None:
+            self.report({'ERROR'}, "Save the file first, or pick a folder that isn't relative to it.")
+            return {'CANCELLED'}
+
+        written = write_shards(scene, folder, category_uids)
+        if not written:
+            self.report({'WARNING'}, "There are no generated poses to write. Create the pose library first.")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"{len(written)} category file(s) written.")
+        return {'FINISHED'}
+
+
+classes = [
+    POSE_OT_WriteShards,
+]
+
+def register():
+
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+
+    classes.reverse()
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+
+if __name__ == '__main__':
+    register()
@@ -2,15 +2,20 @@
 # SPDX-License-Identifier: MIT
 
 import ast
+import contextlib
 import datetime
+import fnmatch
 import getpass
 import json
 import os
+import re
 import subprocess
 import textwrap
 import tempfile
+import uuid
 
 import bpy
+import numpy as np
 from bpy.app.handlers import \
     persistent  # Add handler to ensure code runs after Blender launches
 
@@ -21,6 +26,43 @@ from bpy.props import (BoolProperty, CollectionProperty, EnumProperty,
 from bpy.types import Menu, Operator, PropertyGroup, UIList
 from bpy_extras.io_utils import ExportHelper, ImportHelper
 
+from . import asset_index, library_core, pose_cache, rig_topology
+
+# seconds to wait for more edits before moving the categories
+RELAYOUT_DELAY = 0.2
+
+# seconds to wait after scrubbing stops before switching layers
+LAYER_SWITCH_DELAY = 0.3
+
+# names of the scenes waiting for a relayout
+_relayout_queue = set()
+
+# parsed category layers and ignore controls, keyed by marker
+_display_cache = {}
+
+# the ignore controls last hidden, keyed by armature
+_display_hidden = {}
+
+# bumped whenever categories or poses change, so cached lists are rebuilt
+_library_version = 0
+
+# filter results of the category and pose lists, keyed by list data
+_list_cache = {}
+
+# owner of the message bus subscriptions
+_msgbus_owner = object()
+
+# last known name of each category, keyed by category ID
+_category_names = {}
+
+# category frames sorted for looking up the category on a frame
+_frame_index = {'version': None, 'frames': [], 'indexes': []}
+
+# depth of the suspend_updates blocks, the update callbacks do nothing while it is above zero
+_suspended = 0
+
+# what the update callbacks skipped while suspended, done once at the end
+_missed_updates = set()
 
 # -------------------------------------------------------------------
 #   Properties
@@ -35,17 +77,26 @@ class CUSTOM_PoseProps(PropertyGroup):
     name: StringProperty(
         name="Name",
         description = "Name of the pose",
-        default="New Pose"
+        default="New Pose",
+        update = lambda s, c: update_pose_name(s, c)
     )
     description: StringProperty(
         name = "Description",
         description = "Description of the pose",
-        default = ""
+        default = "",
+        update = lambda s, c: touch_library()
     )
     skip: BoolProperty(
         name = "Skip",
         description = "Skip this pose",
-        default = False
+        default = False,
+        update = lambda s, c: touch_library()
+    )
+    uid: StringProperty(
+        name = "ID",
+        description = "Stable ID of the pose, used to find its generated asset",
+        default = "",
+        options = {'HIDDEN'}
     )
 
 
@@ -115,6 +166,7 @@ class CATEGORY_OT_Clear(Operator):
         else:
             self.clearCategories(context)
 
+        touch_library()
         return {'FINISHED'}
 
 class CATEGORY_OT_Export(Operator, ExportHelper):
@@ -151,56 +203,23 @@ class CATEGORY_OT_Export(Operator, ExportHelper):
 
     def getPoses(self, context):
         """Builds a json file structure of markers and poses"""
-        markers = context.scene.timeline_markers
-        self.data = {}
         self.cameras = []
         # store some information about the file
-        self.data['info'] = {
+        info = {
             "description"   : "This file contains pose data for Blender's Pose Library.",
             "user"          : get_user(),
             "filepath"      : bpy.data.filepath,
             "date"          : date()
         }
-        # Create overall settings
-        self.data['settings'] = {
-            "category_start_frame"   : context.scene.category_start_frame,
-            "category_increments"    : context.scene.category_increments,
-            "category_active_index"  : context.scene.category_active_index,
-            "category_activate_layers": context.scene.category_activate_layers,
-            "category_hide_ignore"  : context.scene.category_hide_ignore,
-            "pose_increments"       : context.scene.pose_increments,
-            "pose_include_neutral"  : context.scene.pose_include_neutral
-        }
-        poses = []
-        for m, marker in enumerate(markers):
-
-            build_category = {
-                "index"     : m,
-                "category"   : marker.name,
-                "ignore"    : ast.literal_eval(marker.ignore), # convert string to array
-                'layers'    : ast.literal_eval(marker.layers), # convert string to array
-                'mirror'    : marker.mirror,
-                'camera'    : str(marker.camera.name)
-
-            }
-            if marker.camera and self.include_cameras:
-                self.cameras.append(str(marker.camera.name))
 
-            pose_list = marker.poses
-
-            build_list = []
-            for p, pose in enumerate(pose_list):
-                build_pose ={
-                    'index': p,
-                    'name': pose.name,
-                    'description': pose.description,
-                }
-                build_list.append(build_pose)
-            build_category['pose'] = build_list
+        # Create overall settings
+        settings = {name: getattr(context.scene, name) for name in library_core.SETTINGS}
 
-            poses.append(build_category)
+        categories = [category_record(marker) for marker in get_ordered_markers(context.scene)]
+        if self.include_cameras:
+            self.cameras = [category.camera for category in categories if category.camera]
 
-        self.data['poses'] = poses
+        self.data = library_core.write_template(categories, settings, info)
 
     def createCameraPythonScript(self, context, path, name):
         filepath = os.path.join(path, (name + "_cameras.blend"))
@@ -297,28 +316,36 @@ class CATEGORY_OT_Import(Operator):
         default=False,
     )
 
+    merge: BoolProperty(
+        name="Merge",
+        description="Merge into the existing categories, only changing what differs.",
+        default=False,
+    )
+
     def read(self, context):
         """Reads the JSON file """
         f = open(self.filepath)
         self.data = json.load(f)
         f.close()
 
+        self.settings, self.categories = library_core.read_template(self.data)
+
     def createSettings(self, context):
         """Apply the settings"""
         scene = context.scene
 
         # now update them.
-        for i in self.data['settings']:
-            setattr(scene, i, self.data['settings'][f"{i}"])
+        for name, value in self.settings.items():
+            setattr(scene, name, value)
 
     def addPoses(self,context):
-        for i in self.data['poses']:
+        for i in self.categories:
             # create the markers first
-            name = i['category']
-            ignore = str(i['ignore'])
-            layers = str(i['layers'])
-            mirror = i['mirror']
-            camera = i['camera']
+            name = i.name
+            ignore = str(i.ignore)
+            layers = str(i.layers)
+            mirror = i.mirror
+            camera = i.camera
 
             bpy.ops.category.new_item(
                 new_name = name,
@@ -329,16 +356,169 @@ class CATEGORY_OT_Import(Operator):
                 skip_poses = True)
 
             # Now create the poses
-            for p in i['pose']:
-                name = p['name']
-                description = p['description']
+            for p in i.poses:
+                name = p.name
+                description = p.description
 
                 bpy.ops.category.new_pose(new_name = name, description = description)
 
+    def mergePoses(self, context):
+        """Merge the template into the existing categories.
+
+        Existing categories are matched by name. Only the categories and poses
+        that differ are added, removed, renamed or reordered, so cameras, skip
+        flags and pose frames of untouched entries are kept."""
+        scene = context.scene
+        markers = scene.timeline_markers
+        self.merged = {'added': 0, 'removed': 0, 'renamed': 0, 'moved': 0}
+
+        # drop duplicate category names, the first one wins
+        incoming = []
+        incoming_names = set()
+        for i in self.categories:
+            if i.name not in incoming_names:
+                incoming_names.add(i.name)
+                incoming.append(i)
+
+        existing = {}
+        for marker in markers:
+            existing.setdefault(marker.name, marker)
+
+        # match the categories by name first
+        ordered = get_ordered_markers(scene)
+        wanted = [existing.get(i.name) for i in incoming]
+        claimed = {m.as_pointer() for m in wanted if m}
+
+        # a new name sitting in the slot of a name that went away is a rename
+        for j, i in enumerate(incoming):
+            if wanted[j] or j >= len(ordered):
+                continue
+            marker = ordered[j]
+            if marker.name not in incoming_names and marker.as_pointer() not in claimed:
+                marker.name = i.name
+                wanted[j] = marker
+                claimed.add(marker.as_pointer())
+                self.merged['renamed'] += 1
+
+        # remove the categories that are no longer in the template
+        for marker in ordered:
+            if marker.as_pointer() not in claimed:
+                markers.remove(marker)
+                self.merged['removed'] += 1
+
+        for j, i in enumerate(incoming):
+            marker = wanted[j]
+            if not marker:
+                # add the new categories at the end, they are ordered below
+                bpy.ops.category.new_item(
+                    new_name = i.name,
+                    camera = i.camera,
+                    layers = str(i.layers),
+                    ignore = str(i.ignore),
+                    mirror = i.mirror,
+                    skip_poses = True)
+                marker = markers[len(markers) - 1]
+                wanted[j] = marker
+                self.merged['added'] += 1
+            else:
+                self.mergeCategory(context, marker, i)
+
+            self.mergeMarkerPoses(marker, i.poses)
+
+        # put the categories in the template order
+        for j, marker in enumerate(wanted):
+            if marker.category_order != j:
+                marker.category_order = j
+                self.merged['moved'] += 1
+
+        relayout_markers(scene)
+
+    def mergeCategory(self, context, marker, category):
+        """Update the settings of an existing category that differ from the template"""
+        layers = str(category.layers)
+        ignore = str(category.ignore)
+
+        if marker.layers != layers:
+            marker.layers = layers
+        if marker.ignore != ignore:
+            marker.ignore = ignore
+        if marker.mirror != category.mirror:
+            marker.mirror = category.mirror
+
+        # keep the existing camera, unless there isn't one yet
+        if not marker.camera_pointer:
+            camera = context.scene.objects.get(category.camera)
+            if camera:
+                marker.camera_pointer = camera
+
+    def mergeMarkerPoses(self, marker, pose_specs):
+        """Merge the poses of a category, keeping untouched poses as they are"""
+        poses = marker.poses
+
+        names = []
+        descriptions = {}
+        for p in pose_specs:
+            if p.name not in descriptions:
+                names.append(p.name)
+                descriptions[p.name] = p.description
+
+        current = [pose.name for pose in poses]
+        wanted = set(names)
+
+        # a new name sitting in the slot of a name that went away is a rename
+        for j, name in enumerate(names):
+            if name in current or j >= len(current):
+                continue
+            if current[j] not in wanted:
+                poses[j].name = name
+                current[j] = name
+                self.merged['renamed'] += 1
+
+        # remove the poses that are no longer in the template, and duplicates
+        seen = set()
+        for k in range(len(current)):
+            name = current[k]
+            if name in wanted and name not in seen:
+                seen.add(name)
+                continue
+            current[k] = None
+
+        for k in reversed(range(len(current))):
+            if current[k] is None:
+                poses.remove(k)
+                del current[k]
+                self.merged['removed'] += 1
+
+        # add the new poses at the end, they are ordered below
+        for name in names:
+            if name not in seen:
+                pose = poses.add()
+                pose.name = name
+                current.append(name)
+                self.merged['added'] += 1
+
+        for k, name in enumerate(current):
+            if poses[k].description != descriptions[name]:
+                poses[k].description = descriptions[name]
+
+        # put the poses in the template order
+        for j, name in enumerate(names):
+            k = current.index(name, j)
+            if k != j:
+                poses.move(k, j)
+                current.insert(j, current.pop(k))
+                self.merged['moved'] += 1
+
+        if marker.pose_active_index >= len(poses):
+            marker.pose_active_index = max(0, len(poses) - 1)
+
     def gatherCameras(self):
         self.camerasToImport = []
-        for p in self.data['poses']:
-            self.camerasToImport.append(p['camera'])
+        for p in self.categories:
+            # when merging, only bring in the cameras we don't have yet
+            if self.merge and bpy.data.objects.get(p.camera):
+                continue
+            self.camerasToImport.append(p.camera)
 
     def importCameras(self):
         """Import the camera from the camera file"""
@@ -374,6 +554,11 @@ class CATEGORY_OT_Import(Operator):
                 print(f'Something failed when trying to bring in {object}')
 
     def execute(self, context):
+        # every category and pose added would change the frame, only refresh once at the end
+        with suspend_updates(context):
+            return self.importTemplate(context)
+
+    def importTemplate(self, context):
         self.cwd = os.path.dirname(__file__)
 
         if self.filepath == "":
@@ -381,17 +566,37 @@ class CATEGORY_OT_Import(Operator):
 
         self.read(context)
 
-        if len(context.scene.timeline_markers) > 0:
+        merge = self.merge and len(context.scene.timeline_markers) > 0
+
+        if len(context.scene.timeline_markers) > 0 and not merge:
             bpy.ops.category.clear(cameras = self.include_cameras, categories = True)
 
         if self.include_cameras:
             self.gatherCameras()
             self.importCameras()
 
+        # where every pose's keys are before the settings and categories change
+        if merge:
+            old_slots = get_pose_slots(context.scene)
+            old_width = max(1, context.scene.pose_increments)
+
         self.createSettings(context)
         #self.clearCategorys(context)
-        self.addPoses(context)
+        if merge:
+            self.mergePoses(context)
+
+            # the categories and poses that moved take their keys with them
+            rig = get_rig(context)
+            if rig and rig.animation_data and rig.animation_data.action:
+                move_pose_keys(rig.animation_data.action, old_slots, get_pose_slots(context.scene), old_width)
 
+            merged = self.merged
+            self.report({'INFO'}, (f"Merged: {merged['added']} added, {merged['removed']} removed, "
+                f"{merged['renamed']} renamed, {merged['moved']} moved."))
+        else:
+            self.addPoses(context)
+
+        touch_library()
         return {'FINISHED'}
 
 class CATEGORY_OT_Import_Prompt(Operator, ImportHelper):
@@ -416,12 +621,18 @@ class CATEGORY_OT_Import_Prompt(Operator, ImportHelper):
         default=False,
     )
 
+    merge: BoolProperty(
+        name="Merge",
+        description="Merge into the existing categories, only changing what differs.",
+        default=False,
+    )
+
     def execute(self, context):
 
         if not self.filepath:
             return {'FINISHED'}
 
-        bpy.ops.category.do_import(filepath = self.filepath, include_cameras = self.include_cameras)
+        bpy.ops.category.do_import(filepath = self.filepath, include_cameras = self.include_cameras, merge = self.merge)
 
         return {'FINISHED'}
 
@@ -530,6 +741,11 @@ class CATEGORY_OT_FixMarkers(Operator):
 
             if marker.name == "" and not marker.camera.name == "":
                 marker.name = marker.camera.name
+
+        # make sure every category has its own place in the order
+        ensure_category_order(scene)
+        relayout_markers(scene)
+        touch_library()
         return {'FINISHED'}
 
 class CATEGORY_OT_Remove(Operator):
@@ -557,22 +773,27 @@ class CATEGORY_OT_Remove(Operator):
             # now find out what the frame number is
             frameToDel = scene.timeline_markers[index].frame
 
+        ensure_category_order(scene)
+
+        removed = None
         for marker in scene.timeline_markers:
             if marker.frame == frameToDel:
+                removed = marker.category_order
                 scene.timeline_markers.remove(marker)
                 break
 
+        # close the gap in the order, only the categories after it move
+        if removed is not None:
+            for marker in scene.timeline_markers:
+                if marker.category_order > removed:
+                    marker.category_order -= 1
+            relayout_markers(scene)
+
         num_markers = len(scene.timeline_markers)
         if scene.category_active_index == num_markers and not num_markers == 0:
             scene.category_active_index = len(scene.timeline_markers) -1
-        else:
-            # iterate through the rest of the categorys and reset the frame
-            for i, marker in enumerate(scene.timeline_markers):
-                new_frame = scene.category_start_frame
-                if i > 0:
-                    new_frame = i * scene.category_increments + scene.category_start_frame
-                marker.frame = new_frame
 
+        touch_library()
         return {'FINISHED'}
 
 class CATEGORY_OT_NewCam(Operator):
@@ -722,34 +943,32 @@ class CATEGORY_OT_NewItem(Operator):
             self.scene.camera = new_cam
 
     def execute(self, context):
+        # each property set below would jump frames, so do it once at the end
+        with suspend_updates(context):
+            return self.addCategory(context)
+
+    def addCategory(self, context):
 
         self.scene = context.scene
 
-        start_frame = self.scene.category_start_frame
-        increment = self.scene.category_increments
         active_index = self.scene.category_active_index
         markers = self.scene.timeline_markers
-        insert_index = len(markers) # set the default insert instance to be the end.
-        shuffle = False
+        insert_order = None
 
-        # if there is no existing marker, go ahead and create one
-        if not markers:
-            # Create the marker
-            marker = self.scene.timeline_markers.new(name=self.new_name, frame=start_frame)
-        else:
-            # markers exist.
-            # get the number of current markers, and create a new one at the end
-            # - note this is temporary until we figure out how to insert
-            num_markers = len(markers)
+        ensure_category_order(self.scene)
 
-            # check and see if the active index is less than the number of markers -
-            # if so, we'll need to shuffle
-            if (active_index < num_markers -1) and (self.insert == True):
-                shuffle = True
-                insert_index = active_index
+        # markers exist.
+        # check and see if the active category is before the last one -
+        # if so, we'll insert the new one right after it
+        num_markers = len(markers)
+        if markers and (self.insert == True) and active_index < num_markers:
+            active_order = markers[active_index].category_order
+            if active_order < num_markers -1:
+                insert_order = active_order + 1
 
-            new_frame = num_markers * increment + start_frame
-            marker = self.scene.timeline_markers.new(name=self.new_name, frame=new_frame)
+        # create the marker at the end of the order
+        marker = self.scene.timeline_markers.new(name=self.new_name, frame=category_frame(self.scene, num_markers))
+        marker.category_order = num_markers
 
         # if a camera was specified, exists, and new camera wasn't
         # specified, then we'll use it.
@@ -780,16 +999,12 @@ class CATEGORY_OT_NewItem(Operator):
         # mirror
         marker.mirror = self.mirror
 
-        # Now shuffle all markers down if needed
-        if shuffle:
-            bpy.ops.category.move_item(direction='DOWN', insert=True, insert_index=insert_index)
-
-            # select the original item
-            self.scene.category_active_index = insert_index + 1
+        # Now move it into place if needed
+        if insert_order is not None:
+            move_category(self.scene, marker, insert_order)
 
-        else:
-            # select the newly created item
-            self.scene.category_active_index = len(self.scene.timeline_markers) -1
+        # select the newly created item
+        self.scene.category_active_index = len(self.scene.timeline_markers) -1
 
         if not self.skip_poses:
 
@@ -801,6 +1016,7 @@ class CATEGORY_OT_NewItem(Operator):
                 description = 'Neutral pose.'
                 bpy.ops.category.new_pose(new_name=new_name, description= description)
 
+        touch_library()
         return{'FINISHED'}
 
     def invoke(self, context, event):
@@ -817,91 +1033,37 @@ class CATEGORY_OT_MoveItem(Operator):
     direction   : EnumProperty(items=(('UP', 'Up', ""),
                                               ('DOWN', 'Down', ""),))
 
-    insert      : BoolProperty(default=False, name="Insert", description = "Insert category.")
+    insert      : BoolProperty(default=False, name="Insert", description = "Move the last category to right after the insert index.")
     insert_index : IntProperty(name = "Insert Index", description = "Insertion index if insert=True.")
 
     @classmethod
     def poll(cls, context):
         return context.scene.timeline_markers
 
-    def move_index(self, context):
-        """ Move index of an item render queue while clamping it. """
-        scene = context.scene
-        index = scene.category_active_index
-        list_length = len(scene.timeline_markers) - 1  # (index starts at 0)
-        new_index = index + (-1 if self.direction == 'UP' else 1)
-
-        scene.category_active_index = max(0, min(new_index, list_length))
-
-    def move(self, context, timeline_markers, neighbor, index):
-        # because there is no way to actually move a timeline_marker in the list, instead we
-        # will shuffle the data by creating a new timeline_marker
-        new_marker = timeline_markers.new(name="tmp", frame=-1000)
-
-        # get the properties we want from the index and move them to the new_marker
-        props = ['name', 'pose_active_index', 'camera_pointer', 'layers', 'mirror', 'ignore']
-
-        for prop in props:
-            # copy the current index attributes to the temporary one
-            value = getattr(timeline_markers[index], prop)
-            setattr(new_marker, prop, value)
-
-            # copy the neighbor's attributes to the index
-            value = getattr(timeline_markers[neighbor], prop)
-            setattr(timeline_markers[index], prop, value)
-
-            # copy the temporary attributes to the neighbor
-            value = getattr(new_marker, prop)
-            setattr(timeline_markers[neighbor], prop, value)
-
-        # Now adjust the poses - this can't just be compied because it's a
-        # CollectionProperty
-        #
-        # index to temporary
-        for pose in timeline_markers[index].poses:
-            new_pose = new_marker.poses.add()
-            new_pose.name = pose.name
-
-        try:
-            del timeline_markers[index]['poses']
-        except:
-            pass
-
-        # neighbor to index
-        for pose in timeline_markers[neighbor].poses:
-            new_pose2 = timeline_markers[index].poses.add()
-            new_pose2.name  = pose.name
-        try:
-            del timeline_markers[neighbor]['poses']
-        except:
-            pass
-
-        # temporary to neighbor
-        for pose in new_marker.poses:
-            new_pose3 = timeline_markers[neighbor].poses.add()
-            new_pose3.name = pose.name
-
-        # delete the temporary marker
-        marker = len(timeline_markers) -1
-        timeline_markers.remove(new_marker)
-
     def execute(self, context):
         scene = context.scene
         my_list = scene.timeline_markers
-        index = context.scene.category_active_index
+
+        # categories are ordered by their order key, so moving one only
+        # swaps the keys and frames of the categories involved.
+        ensure_category_order(scene)
 
         if not self.insert:
-            neighbor = index + (-1 if self.direction == 'UP' else 1)
-            self.move(context, my_list, neighbor, index)
-            self.move_index(context)
+            marker = my_list[scene.category_active_index]
+            new_order = marker.category_order + (-1 if self.direction == 'UP' else 1)
+            new_order = max(0, min(new_order, len(my_list) - 1))
+            move_category(scene, marker, new_order)
 
         else:
-            # iterate backwards from the last marker to the index
-            for i in reversed(range(index + 2, len(my_list)+1)):
-                neighbor = i -1
-                self.move(context, my_list, neighbor, i)
+            # move the last category to right after the index
+            marker = get_ordered_markers(scene)[-1]
+            new_order = my_list[self.insert_index].category_order + 1
+            move_category(scene, marker, min(new_order, len(my_list) - 1))
 
-        # update frames in category
+        # the active category stays selected, so follow it to its new frame
+        go_to_frame(scene, context, 'category_active_index')
+
+        touch_library()
         return{'FINISHED'}
 
 class POSE_OT_NewItem(Operator):
@@ -951,6 +1113,11 @@ class POSE_OT_NewItem(Operator):
             return False
 
     def execute(self, context):
+        # inserting moves the active pose more than once, so only go to it at the end
+        with suspend_updates(context):
+            return self.addPose(context)
+
+    def addPose(self, context):
         # Get the current info
         marker = get_marker(context)
 
@@ -989,6 +1156,7 @@ class POSE_OT_NewItem(Operator):
             # select the last one
             marker.pose_active_index = len(marker.poses) -1
 
+        touch_library()
         return{'FINISHED'}
 
     def invoke(self, context, event):
@@ -1037,6 +1205,10 @@ class POSE_OT_MoveItem(Operator):
         marker.pose_active_index = max(0, min(new_index, list_length))
 
     def execute(self, context):
+        with suspend_updates(context):
+            return self.movePose(context)
+
+    def movePose(self, context):
         marker = get_marker(context)
         pose_list = marker.poses
 
@@ -1052,6 +1224,7 @@ class POSE_OT_MoveItem(Operator):
                 neighbor = i -1
                 pose_list.move(neighbor, i)
 
+        touch_library()
         return{'FINISHED'}
 
 class POSE_OT_Remove(Operator):
@@ -1073,6 +1246,7 @@ class POSE_OT_Remove(Operator):
         if self.pose_index == orig_len:
             marker.pose_active_index = len(marker.poses) -1
 
+        touch_library()
         return {'FINISHED'}
 
 class POSE_OT_Skip(Operator):
@@ -1116,6 +1290,7 @@ class CATEGORY_MT_context_menu(Menu):
         layout.separator()
         layout.operator('category.do_import_prompt', icon="IMPORT")
         layout.operator('category.do_import_prompt', icon="CAMERA_DATA", text = "Import Categorys & Cameras").include_cameras = True
+        layout.operator('category.do_import_prompt', icon="AUTOMERGE_ON", text = "Merge Categorys").merge = True
         op = layout.operator('category.do_import', icon='IMPORT', text="Import Default Template").include_cameras = True
         layout.separator()
         layout.separator()
@@ -1144,6 +1319,11 @@ class POSE_MT_context_menu(Menu):
         clear.poses = True
         clear.categories = False
         layout.separator()
+        layout.operator('pose.library_footprint', text="Library Footprint Report", icon="MEMORY")
+        layout.operator('pose.find_duplicates', text="Find Duplicate Poses", icon="VIEWZOOM").action = 'REPORT'
+        layout.operator('pose.find_duplicates', text="Skip Duplicate Poses", icon="HIDE_ON").action = 'SKIP'
+        layout.operator('pose.find_duplicates', text="Merge Duplicate Poses", icon="AUTOMERGE_ON").action = 'MERGE'
+        layout.separator()
 
         mb = layout.operator('wm.message_box', text="Help", icon="QUESTION")
         msg = """Each category can contain multiple poses.
@@ -1162,14 +1342,28 @@ A library pose will be automatically generated for each frame."""
 class POSE_UL_list(UIList):
     """Poses UIList."""
 
+    filter_skip: EnumProperty(
+        name = "Skip",
+        items = (('ALL', 'All', "Show all poses"),
+                 ('ACTIVE', 'Active', "Only show the poses that will be created"),
+                 ('SKIPPED', 'Skipped', "Only show the skipped poses")),
+        default = 'ALL'
+    )
+
+    sort_mode: EnumProperty(
+        name = "Sort",
+        items = (('FRAME', 'Frame', "Sort by frame"),
+                 ('NAME', 'Name', "Sort by name"),
+                 ('DESCRIPTION', 'Description', "Sort by description")),
+        default = 'FRAME'
+    )
+
     def draw_item(self, context, layout, data, item, icon, active_data,
                   active_propname, index):
         #self.use_filter_show = False
 
-        marker_list = context.scene.timeline_markers
-        marker_index = context.scene.category_active_index
-        pose_increment = context.scene.pose_increments
-        frame = marker_list[marker_index].frame + (index * pose_increment)
+        # the frames are worked out once per redraw in filter_items
+        frame = get_list_frames(data)[index]
         skip = getattr(item, "skip")
 
         if self.layout_type in {'DEFAULT', 'COMPACT'}:
@@ -1208,10 +1402,55 @@ class POSE_UL_list(UIList):
             layout.alignment = 'CENTER'
             layout.label(text=item.name)
 
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="", icon='VIEWZOOM')
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+
+        row = layout.row(align=True)
+        row.prop(self, "filter_skip", expand=True)
+
+        row = layout.row(align=True)
+        row.prop(self, "sort_mode", expand=True)
+        row.prop(self, "use_filter_sort_reverse", text="", icon='SORT_DESC' if self.use_filter_sort_reverse else 'SORT_ASC')
+
+    def filter_items(self, context, data, propname):
+        """Search, skip filtering and sorting, cached until the poses change"""
+        poses = getattr(data, propname)
+        scene = context.scene
+
+        signature = (_library_version, len(poses), data.frame, scene.pose_increments,
+            self.filter_name, self.filter_skip, self.sort_mode)
+        cached = get_list_cache(data, signature)
+        if cached:
+            return cached
+
+        flt_flags = []
+        pattern = f"*{self.filter_name.lower()}*"
+        for pose in poses:
+            show = True
+            if self.filter_name:
+                show = fnmatch.fnmatchcase(pose.name.lower(), pattern) or \
+                    fnmatch.fnmatchcase(pose.description.lower(), pattern)
+            if self.filter_skip == 'ACTIVE':
+                show = show and not pose.skip
+            elif self.filter_skip == 'SKIPPED':
+                show = show and pose.skip
+            flt_flags.append(self.bitflag_filter_item if show else 0)
+
+        flt_neworder = []
+        if self.sort_mode == 'NAME':
+            flt_neworder = sort_order([pose.name.lower() for pose in poses])
+        elif self.sort_mode == 'DESCRIPTION':
+            flt_neworder = sort_order([pose.description.lower() for pose in poses])
+
+        frames = [data.frame + (i * scene.pose_increments) for i in range(len(poses))]
+
+        return set_list_cache(data, signature, flt_flags, flt_neworder, frames)
+
 class CATEGORY_UL_list(UIList):
 
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname):
-        self.use_filter_show = False
         scene = data
         ob = item
         #print(data, item, active_data, active_propname)
@@ -1240,6 +1479,31 @@ class CATEGORY_UL_list(UIList):
             row = s3
             op = row.operator('category.remove', text='', icon='X', emboss=False).frame = ob.frame
 
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="", icon='VIEWZOOM')
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+
+    def filter_items(self, context, data, propname):
+        """Show the categories by their order key, cached until the categories change"""
+        markers = getattr(data, propname)
+
+        signature = (_library_version, len(markers), self.filter_name)
+        cached = get_list_cache(data, signature)
+        if cached:
+            return cached
+
+        flt_flags = [self.bitflag_filter_item] * len(markers)
+        if self.filter_name:
+            pattern = f"*{self.filter_name.lower()}*"
+            for i, marker in enumerate(markers):
+                if not fnmatch.fnmatchcase(marker.name.lower(), pattern):
+                    flt_flags[i] = 0
+
+        flt_neworder = sort_order([(marker.category_order, marker.frame) for marker in markers])
+
+        return set_list_cache(data, signature, flt_flags, flt_neworder)
+
 # -------------------------------------------------------------------
 #   Settings UI
 # -------------------------------------------------------------------
@@ -1274,6 +1538,7 @@ class VIEW3D_PT_FP_libUI(bpy.types.Panel):
         category.prop(scene, "category_increments", text = "Frames Between Categorys")
 
         props = settings_area.column(align=True)
+        props.prop(scene, "category_rig", text = "Rig", icon = "ARMATURE_DATA")
         props.prop(scene, "pose_increments", text = "Frames Between Poses")
         props.prop(scene, "pose_include_neutral", text = "Include a .neutral pose in each category.")
 
@@ -1356,6 +1621,9 @@ class VIEW3D_PT_FP_libViewUI(bpy.types.Panel):
 
         view_box.prop(scene, "category_activate_layers", text="Auto Layer Switch")
         view_box.prop(scene, "category_hide_ignore", text="Hide Ignore Controls")
+        view_box.prop(scene, "category_follow_frame", text="Follow Timeline")
+        view_box.prop(scene, "category_instant_preview", text="Instant Pose Preview")
+        view_box.prop(scene, "pose_library_live", text="Live Library")
 
 
     def execute(self, context):
@@ -1547,6 +1815,12 @@ class VIEW3D_PT_FP_libPoseUI(bpy.types.Panel):
 
         button_area.operator('pose.create_pose_library', icon="ASSET_MANAGER")
 
+        scope_row = layout.row(align=True)
+        scope_row.operator('pose.create_pose_library', text="Build Category", icon="BOOKMARKS").scope = 'CATEGORY'
+        scope_row.operator('pose.create_pose_library', text="Build Pose", icon="ARMATURE_DATA").scope = 'POSE'
+        layout.operator('pose.render_previews', icon="RENDER_STILL")
+        layout.operator('pose.write_library_shards', icon="FILE_BLEND")
+
     def execute(self, context):
 
         return {'FINISHED'}
@@ -1561,6 +1835,24 @@ def _label_multiline(context, text, parent):
     for text_line in text_lines:
         parent.label(text=text_line)
 
+def category_frame(scene, order):
+    """Returns the frame of the category at the given place in the order"""
+    return library_core.category_frame(scene.category_start_frame, scene.category_increments, order)
+
+def category_record(marker):
+    """Returns a category and its poses as a plain record"""
+    poses = [library_core.Pose(pose.name, pose.description, pose.skip, pose.uid) for pose in marker.poses]
+    return library_core.Category(marker.name,
+        frame = marker.frame,
+        order = marker.category_order,
+        uid = marker.category_uid,
+        layers = ast.literal_eval(marker.layers), # convert string to array
+        ignore = ast.literal_eval(marker.ignore), # convert string to array
+        mirror = marker.mirror,
+        camera = marker.camera.name if marker.camera else "",
+        poses = poses,
+        active_pose = marker.pose_active_index)
+
 def date():
     """Returns date and time in a nice format"""
     now = datetime.datetime.utcnow()
@@ -1594,22 +1886,18 @@ def duplicate(obj, data=True, actions=True, collection=None):
 
 def fix_blank_controls(self, context, origin):
     """Make sure the controls aren't left blank"""
+    if _suspended:
+        _missed_updates.add('controls')
+        return
+
     result = getattr(self, origin)
     if result.strip() == "":
         setattr(self, origin, "[]")
 
 def get_arm(context):
-    mode = context.mode
-    if mode == 'POSE':
-        return context.pose_object.data
-    else:
-        # no armature is selected, so we'll just grab the first one
-        # visible in the scene
-        objs = bpy.data.objects
-        for obj in objs:
-            if obj.type == 'ARMATURE':
-                if obj.visible_get():
-                    return obj.data
+    rig = get_rig(context)
+    if rig:
+        return rig.data
     return False
 
 def get_current_layers(arm):
@@ -1619,6 +1907,66 @@ def get_current_layers(arm):
             layersOn.append(i)
     return layersOn
 
+def ensure_category_order(scene):
+    """Make sure every category has its own order key.
+
+    Categories made before the order keys existed all share the same key,
+    so they are put in order by frame."""
+    markers = scene.timeline_markers
+    orders = {marker.category_order for marker in markers}
+    if len(orders) == len(markers) and orders == set(range(len(markers))):
+        return
+
+    ordered = sorted(markers, key=lambda m: (m.category_order, m.frame))
+    for i, marker in enumerate(ordered):
+        if marker.category_order != i:
+            marker.category_order = i
+    touch_library()
+
+def get_ordered_markers(scene):
+    """Returns the category markers sorted by their order key"""
+    ensure_category_order(scene)
+    return sorted(scene.timeline_markers, key=lambda m: m.category_order)
+
+def find_pose(scene, frame):
+    """Returns the category and pose index on a frame, or None if there isn't one"""
+    markers = scene.timeline_markers
+    frames, indexes = get_frame_index(scene)
+
+    # the frames moved without the library changing, so start again
+    i = library_core.category_at(frames, frame)
+    if i >= 0 and markers[indexes[i]].frame != frames[i]:
+        _frame_index['version'] = None
+        frames, indexes = get_frame_index(scene)
+
+    return library_core.find_pose(markers, frames, indexes, frame, scene.pose_increments)
+
+def find_view3d(context):
+    """Returns a window and 3D view to run pose operators from, when run from a timer or script"""
+    for window in context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                return window, area
+    return None, None
+
+def get_frame_index(scene):
+    """Returns the category frames in order and the index of each category"""
+    if _frame_index['version'] != _library_version or len(_frame_index['frames']) != len(scene.timeline_markers):
+        _frame_index['frames'], _frame_index['indexes'] = library_core.frame_index(scene.timeline_markers)
+        _frame_index['version'] = _library_version
+
+    return _frame_index['frames'], _frame_index['indexes']
+
+def get_list_cache(data, signature):
+    """Returns the cached filter result of a list, if it is still valid"""
+    cached = _list_cache.get(data.as_pointer())
+    if cached and cached[0] == signature:
+        return cached[1], cached[2]
+
+def get_list_frames(data):
+    """Returns the frames worked out for each row of a list"""
+    return _list_cache[data.as_pointer()][3]
+
 def get_marker(context):
     return context.scene.timeline_markers[context.scene.category_active_index]
 
@@ -1628,11 +1976,128 @@ def get_pose(marker):
     except:
         return False
 
+def get_pose_slots(scene):
+    """Returns the frame of every pose, keyed by the IDs of its category and pose"""
+    slots = {}
+    for marker in scene.timeline_markers:
+        category_uid = get_uid(marker, 'category_uid')
+        for p, pose in enumerate(marker.poses):
+            slots[(category_uid, get_uid(pose, 'uid'))] = marker.frame + p * scene.pose_increments
+    return slots
+
+def get_rig(context):
+    """Returns the armature object the template works on.
+
+    The rig is stored on the scene, so the scene is only searched
+    when no rig has been found yet, or the stored one was taken out of it."""
+    scene = context.scene
+    rig = scene.category_rig
+    if rig and scene.objects.get(rig.name) != rig:
+        scene.category_rig = None
+        rig = None
+
+    if context.mode == 'POSE' and context.pose_object:
+        if not rig:
+            scene.category_rig = context.pose_object
+        return context.pose_object
+
+    if rig:
+        return rig
+
+    # no armature is selected, so we'll just grab the first one
+    # visible in the scene
+    for obj in scene.objects:
+        if obj.type == 'ARMATURE':
+            if obj.visible_get():
+                scene.category_rig = obj
+                return obj
+    return None
+
+def get_uid(item, prop):
+    """Returns the stable ID of a category or pose, making one the first time"""
+    uid = getattr(item, prop)
+    if not uid:
+        uid = uuid.uuid4().hex
+        setattr(item, prop, uid)
+    return uid
+
 def get_user():
     """Returns the user"""
     return (getpass.getuser())
 
+def move_pose_keys(action, old_slots, new_slots, width):
+    """Move the keys of every pose from its old frame to its new one, all at once.
+
+    A pose's keys are the ones from its old frame up to the next pose. The
+    keys of poses that were removed are deleted, so they don't end up on
+    another pose, and keys outside of every pose are left alone."""
+    keys = sorted(old_slots, key=old_slots.get)
+    if not keys:
+        return
+
+    starts = np.array([old_slots[key] for key in keys], dtype=np.float64)
+    offsets = np.array([new_slots[key] - old_slots[key] if key in new_slots else np.nan for key in keys])
+    if not np.any(offsets != 0):
+        return
+
+    for fcurve in action.fcurves:
+        points = fcurve.keyframe_points
+        count = len(points)
+        if not count:
+            continue
+
+        co = np.empty(count * 2, dtype=np.float32)
+        points.foreach_get('co', co)
+        times = co[0::2]
+
+        slot = np.searchsorted(starts, times, side='right') - 1
+        inside = (slot >= 0) & (times < starts[np.maximum(slot, 0)] + width)
+        shift = np.zeros(count)
+        shift[inside] = offsets[slot[inside]]
+        removed = np.isnan(shift)
+        shift[removed] = 0.0
+        if not removed.any() and not shift.any():
+            continue
+
+        # read everything before writing, so poses can swap places
+        for prop in ('co', 'handle_left', 'handle_right'):
+            values = np.empty(count * 2, dtype=np.float32)
+            points.foreach_get(prop, values)
+            values[0::2] += shift
+            points.foreach_set(prop, values)
+
+        for i in reversed(np.flatnonzero(removed)):
+            points.remove(points[int(i)], fast=True)
+
+        fcurve.update()
+
+def move_category(scene, marker, order):
+    """Move a category to a new place in the order.
+
+    Only the order keys and frames of the categories between the old and the
+    new place are touched."""
+    old = marker.category_order
+    if order == old:
+        return
+
+    step = -1 if order > old else 1
+    low, high = min(old, order), max(old, order)
+    for other in scene.timeline_markers:
+        if other.as_pointer() == marker.as_pointer():
+            continue
+        if low <= other.category_order <= high:
+            other.category_order += step
+            other.frame = category_frame(scene, other.category_order)
+
+    marker.category_order = order
+    marker.frame = category_frame(scene, order)
+    touch_library()
+
 def go_to_frame(self, context, origin):
+    if _suspended:
+        _missed_updates.add(origin)
+        return
+
     result = getattr(self, origin)
     scene = context.scene
     marker_list = scene.timeline_markers
@@ -1646,8 +2111,12 @@ def go_to_frame(self, context, origin):
     if self.name == 'Scene':
         scene.frame_current = marker.frame
     else:
-        # set the frame
-        scene.frame_current = marker.frame + (pose_increment * pose_active_index)
+        # show the pose from the cache if we can, otherwise set the frame
+        previewed = False
+        if scene.category_instant_preview and context.pose_object:
+            previewed = pose_cache.preview_pose(context.pose_object, marker, pose_active_index, pose_increment)
+        if not previewed:
+            scene.frame_current = marker.frame + (pose_increment * pose_active_index)
 
         # set the name
         marker.pose_active_name = marker.poses[pose_active_index].name
@@ -1662,6 +2131,9 @@ def is_active_cloudrig(context):
     if rig and is_cloudrig(rig):
         return rig
 
+def is_armature(scene, obj):
+    return obj.type == 'ARMATURE'
+
 def is_camera(scene, obj):
     if obj.type == 'CAMERA':
         return True
@@ -1690,42 +2162,219 @@ def save_tempfile():
 
     return mytempfile
 
+def get_marker_display(marker, arm):
+    """Returns the layer visibility and ignored bone indices of a category.
+
+    The layers and ignore strings are only parsed again when they change,
+    or when the bones of the armature change."""
+    key = marker.as_pointer()
+    layers = marker.layers
+    ignore = marker.ignore
+    topology = rig_topology.get_topology(arm)
+
+    cached = _display_cache.get(key)
+    if cached and cached[0] == layers and cached[1] == ignore and cached[2] is topology:
+        return cached[3], cached[4]
+
+    layers_on = ast.literal_eval(layers)
+    visible = tuple(i in layers_on for i in range(0,32))
+
+    ignored = frozenset(topology.find(ast.literal_eval(ignore)).tolist())
+
+    _display_cache[key] = (layers, ignore, topology, visible, ignored)
+    return visible, ignored
+
+def set_list_cache(data, signature, flt_flags, flt_neworder, frames=None):
+    """Stores the filter result of a list and returns it"""
+    _list_cache[data.as_pointer()] = (signature, flt_flags, flt_neworder, frames)
+    return flt_flags, flt_neworder
+
+@contextlib.contextmanager
+def suspend_updates(context=None, refresh=True):
+    """Mute the go_to_frame, fix_blank_controls and update_marker callbacks,
+    and the frame change handler.
+
+    Blocks can be nested. When the outermost one ends, what the callbacks
+    skipped is done once, unless refresh is False."""
+    global _suspended
+    _suspended += 1
+    try:
+        yield
+    finally:
+        _suspended -= 1
+        if _suspended == 0:
+            missed = set(_missed_updates)
+            _missed_updates.clear()
+            if refresh and missed:
+                refresh_library(context or bpy.context, missed)
+
+def refresh_library(context, missed):
+    """Do once what the update callbacks skipped while they were suspended"""
+    scene = context.scene
+    markers = scene.timeline_markers
+
+    if 'controls' in missed:
+        for marker in markers:
+            fix_blank_controls(marker, context, 'layers')
+            fix_blank_controls(marker, context, 'ignore')
+
+    if 'camera' in missed:
+        for marker in markers:
+            if marker.camera != marker.camera_pointer:
+                update_marker(marker, context)
+
+    if not markers or scene.category_active_index >= len(markers):
+        return
+
+    # go to the active pose, or to the category if only it changed
+    marker = markers[scene.category_active_index]
+    if 'pose_active_index' in missed and marker.pose_active_index < len(marker.poses):
+        go_to_frame(marker, context, 'pose_active_index')
+    elif missed & {'category_active_index', 'pose_active_index'}:
+        go_to_frame(scene, context, 'category_active_index')
+
+def sort_order(keys):
+    """Returns the new position of every item when sorted by the given keys"""
+    neworder = [0] * len(keys)
+    for position, i in enumerate(sorted(range(len(keys)), key=keys.__getitem__)):
+        neworder[i] = position
+    return neworder
+
+def subscribe_library():
+    """Watch the category names, they are built in so they have no update callback"""
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.TimelineMarker, "name"),
+        owner=_msgbus_owner,
+        args=(),
+        notify=update_category_names)
+
 def toggle_display_layers(context):
     marker = get_marker(context)
-    layers = marker.layers
     arm = get_arm(context)
+    if not arm:
+        return
 
-    for i in range(0,32):
-        if i in ast.literal_eval(layers):
-            arm.layers[i] = True
-        else:
-            arm.layers[i] = False
+    visible, ignored = get_marker_display(marker, arm)
+
+    # only switch the layers when they differ
+    if tuple(arm.layers) != visible:
+        arm.layers = visible
 
     # now work with ignore layers
     #
-    # first reveal all hidden controls
-    bpy.ops.pose.reveal()
+    # only reveal the controls we hid before and that are no longer ignored,
+    # then hide the ignored controls that aren't hidden yet
+    if not context.scene.category_hide_ignore:
+        ignored = frozenset()
+
+    bones = arm.bones
+    num_bones = len(bones)
+    previous = _display_hidden.get(arm.as_pointer(), frozenset())
+
+    for i in previous - ignored:
+        if i < num_bones and bones[i].hide:
+            bones[i].hide = False
+
+    for i in ignored:
+        if not bones[i].hide:
+            bones[i].hide = True
+
+    _display_hidden[arm.as_pointer()] = ignored
+
 
-    # now hide all controls we should ignore
-    if context.scene.category_hide_ignore:
-        ignore_bones = ast.literal_eval(marker.ignore)
-        for control in ignore_bones:
-            arm.bones[control].hide = True
+def relayout_markers(scene):
+    """Put every category on the frame derived from its order.
 
+    Categories that are already on the right frame are left alone.
+    Returns the number of categories moved."""
+    ensure_category_order(scene)
+
+    markers = scene.timeline_markers
+    records = [library_core.Category(marker.name, frame=marker.frame, order=marker.category_order)
+        for marker in markers]
+    moved = library_core.layout(records, scene.category_start_frame, scene.category_increments)
+
+    for marker, category in zip(markers, records):
+        if marker.frame != category.frame:
+            marker.frame = category.frame
+
+    if moved:
+        touch_library()
+    return len(moved)
+
+def relayout_timer():
+    """Relayout the scenes queued by update_marker_frame"""
+    while _relayout_queue:
+        scene = bpy.data.scenes.get(_relayout_queue.pop())
+        if scene:
+            relayout_markers(scene)
+
+    # don't repeat
+    return None
+
+def layer_switch_timer():
+    """Switch the layers of the category the timeline stopped on"""
+    context = bpy.context
+    if context.scene.timeline_markers and context.scene.category_activate_layers:
+        toggle_display_layers(context)
+
+    # don't repeat
+    return None
+
+def touch_library(*args):
+    """Mark the categories and poses as changed so the cached lists are rebuilt"""
+    global _library_version
+    _library_version += 1
+
+def update_category_names(*args):
+    """Rename the generated assets of categories that were renamed"""
+    touch_library()
+
+    scene = bpy.context.scene
+    renamed = [marker for marker in scene.timeline_markers
+        if marker.category_uid and _category_names.get(marker.category_uid) != marker.name]
+    if not renamed:
+        return
+
+    # read the actions once for every category renamed at the same time
+    asset_index.rebuild()
+    for marker in renamed:
+        asset_index.rename_category(marker)
+        _category_names[marker.category_uid] = marker.name
+
+def update_pose_name(self, context):
+    """Rename the generated asset of the pose along with it"""
+    touch_library()
+
+    if not self.uid:
+        return
+
+    # the pose lives in scene.timeline_markers[i].poses[j]
+    match = re.match(r'timeline_markers\[(\d+)\]', self.path_from_id())
+    if match:
+        marker = self.id_data.timeline_markers[int(match.group(1))]
+        asset_index.rename_pose(marker, self)
 
 def update_marker(self, context):
+    if _suspended:
+        _missed_updates.add('camera')
+        return
+
     # get the value of the object
     self.camera = self.camera_pointer
 
 
 def update_marker_frame(self, context):
-    """Update the category start frame"""
-    scene = context.scene
-    category_start_frame = scene.category_start_frame
-    category_increments = scene.category_increments
-    markers = scene.timeline_markers
-    for i, marker in enumerate(markers):
-        marker.frame = i*category_increments + category_start_frame
+    """Update the category start frame.
+
+    Dragging the value fires this many times a second, so the relayout is
+    queued and runs once the value has stopped changing."""
+    _relayout_queue.add(context.scene.name)
+
+    # restart the timer so a drag only relayouts once
+    if bpy.app.timers.is_registered(relayout_timer):
+        bpy.app.timers.unregister(relayout_timer)
+    bpy.app.timers.register(relayout_timer, first_interval=RELAYOUT_DELAY)
 
 
 # Create all the properties
@@ -1750,6 +2399,18 @@ def create_properties():
                                                         name="Hide Ignore Controls",
                                                         description="Hides ignored controls when changing selection",
                                                         update = lambda s, c: go_to_frame(s, c, 'category_active_index'))
+    bpy.types.Scene.category_follow_frame = BoolProperty(default = True,
+                                                        name="Follow Timeline",
+                                                        description="Select the category and pose on the current frame when scrubbing or playing the timeline")
+
+    bpy.types.Scene.category_instant_preview = BoolProperty(default = False,
+                                                        name="Instant Pose Preview",
+                                                        description="Show poses from a cache when browsing instead of changing the frame. Change the frame to edit a pose")
+
+    bpy.types.Scene.category_rig = PointerProperty(type=bpy.types.Object,
+                                                        name="Rig",
+                                                        description="Armature the template works on. Found automatically when empty",
+                                                        poll=is_armature)
 
     bpy.types.Scene.pose_increments = IntProperty(      default = 1,
                                                         description = "Number of frames between each pose.")
@@ -1761,6 +2422,12 @@ def create_properties():
     bpy.types.TimelineMarker.pose_active_index = IntProperty(update=lambda s, c: go_to_frame(s, c, 'pose_active_index'))
 
     bpy.types.TimelineMarker.pose_active_name = StringProperty()
+    bpy.types.TimelineMarker.category_uid = StringProperty(name="ID",
+        description = "Stable ID of the category, used to find its generated assets",
+        options = {'HIDDEN'})
+    bpy.types.TimelineMarker.category_order = IntProperty(name="Order",
+        description = "Place of the category in the list. The frame of the category is derived from it.",
+        min = 0)
     bpy.types.TimelineMarker.camera_pointer = PointerProperty(type=bpy.types.Object, name="Camera", poll=is_camera, update=update_marker)
     bpy.types.TimelineMarker.layers = StringProperty(name="Visible Layers",
         default="[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27]",
@@ -1822,23 +2489,87 @@ classes = (
            )
 
 # register all the classes
+@persistent
+def frame_change_handler(scene, depsgraph=None):
+    """Select the category and pose on the current frame while scrubbing.
+
+    Operators stepping through the frames suspend the updates, so the
+    selection and layers aren't changed under them."""
+    if _suspended or not scene.category_follow_frame or not scene.timeline_markers:
+        return
+
+    found = find_pose(scene, scene.frame_current)
+    if not found:
+        return
+
+    category_index, pose_index = found
+    marker = scene.timeline_markers[category_index]
+    if scene.category_active_index == category_index and marker.pose_active_index == pose_index:
+        return
+
+    # the selection is following the timeline, leave the frame alone
+    with suspend_updates(refresh=False):
+        if scene.category_active_index != category_index:
+            scene.category_active_index = category_index
+        if marker.pose_active_index != pose_index:
+            marker.pose_active_index = pose_index
+        marker.pose_active_name = marker.poses[pose_index].name
+
+    # switching layers is slow, so wait until scrubbing stops
+    if scene.category_activate_layers:
+        if bpy.app.timers.is_registered(layer_switch_timer):
+            bpy.app.timers.unregister(layer_switch_timer)
+        bpy.app.timers.register(layer_switch_timer, first_interval=LAYER_SWITCH_DELAY)
+
+@persistent
+def load_post_handler(dummy):
+    # message bus subscriptions are cleared when a file is loaded
+    _list_cache.clear()
+    _category_names.clear()
+    asset_index.clear()
+    _display_cache.clear()
+    _display_hidden.clear()
+    subscribe_library()
+
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
 
     create_properties()
 
+    subscribe_library()
+    bpy.app.handlers.load_post.append(load_post_handler)
+    bpy.app.handlers.frame_change_post.append(frame_change_handler)
+
 def unregister():
 
     unreg = bpy.utils.unregister_class
     for cls in classes:
         bpy.utils.unregister_class(cls)
 
+    if bpy.app.timers.is_registered(relayout_timer):
+        bpy.app.timers.unregister(relayout_timer)
+    _relayout_queue.clear()
+    _display_cache.clear()
+    _display_hidden.clear()
+    _list_cache.clear()
+
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    if load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_post_handler)
+    if frame_change_handler in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.remove(frame_change_handler)
+    if bpy.app.timers.is_registered(layer_switch_timer):
+        bpy.app.timers.unregister(layer_switch_timer)
+
     del bpy.types.Scene.category_start_frame
     del bpy.types.Scene.category_increments
     del bpy.types.Scene.category_active_index
     del bpy.types.Scene.category_activate_layers
     del bpy.types.Scene.category_hide_ignore
+    del bpy.types.Scene.category_follow_frame
+    del bpy.types.Scene.category_instant_preview
+    del bpy.types.Scene.category_rig
     del bpy.types.Scene.pose_increments
     del bpy.types.Scene.pose_include_neutral
 
@@ -0,0 +1,297 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import time
+import zlib
+from collections import OrderedDict
+
+import bpy
+import numpy as np
+from bpy.props import BoolProperty
+from bpy.app.handlers import persistent # Add handler to ensure code runs after Blender launches
+
+from . import library_core, library_template_UI, mirror_pose, rig_topology
+
+
+# seconds without edits before the edited poses are rebuilt
+IDLE_DELAY = 1.0
+
+# seconds between rebuilding one queued pose and the next
+REBUILD_INTERVAL = 0.05
+
+# most poses waiting to be rebuilt, past this the whole library is rebuilt once instead
+QUEUE_LIMIT = 64
+
+# poses waiting to be rebuilt, keyed by (scene name, category ID, pose ID)
+_queue = OrderedDict()
+
+# scenes to rebuild in full because too many poses changed at once
+_rebuild_all = set()
+
+# content of the keys on every pose frame, keyed by scene name
+_pose_keys = {}
+
+# scenes whose rig's action changed since its keys were last read
+_changed = set()
+
+# time of the last edit or frame change
+_last_edit = 0.0
+
+# set while poses are being rebuilt, so the rebuild doesn't queue itself
+_building = False
+
+
+def get_action(scene):
+    rig = scene.category_rig
+    if rig and rig.animation_data:
+        return rig.animation_data.action
+    return None
+
+def get_pose_frames(scene):
+    """Returns the frame of every pose and the category and pose IDs on each frame"""
+    poses = {}
+    increments = scene.pose_increments
+    for marker in scene.timeline_markers:
+        category_uid = library_template_UI.get_uid(marker, 'category_uid')
+        for p, pose in enumerate(marker.poses):
+            poses[library_core.pose_frame(marker, p, increments)] = (category_uid, library_template_UI.get_uid(pose, 'uid'))
+    return poses
+
+def read_pose_keys(action, frames):
+    """Returns a checksum of the keys on each of the frames.
+
+    Every F-Curve is read in one call and the keys of all of them are
+    grouped by frame, so a frame's checksum changes when any key on it does."""
+    frames = np.array(sorted(frames), dtype=np.float32)
+    times, curves, values = [], [], []
+    for fcurve in action.fcurves:
+        co = mirror_pose.read_keys(fcurve.keyframe_points)
+        on_pose = np.isin(co[:, 0], frames)
+        if not on_pose.any():
+            continue
+
+        # identify the curve by what it animates, so adding curves doesn't change the others
+        curve = zlib.crc32(f"{fcurve.data_path}[{fcurve.array_index}]".encode())
+        times.append(co[on_pose, 0])
+        curves.append(np.full(on_pose.sum(), curve, dtype=np.uint32))
+        values.append(co[on_pose, 1])
+
+    if not times:
+        return {}
+
+    times = np.concatenate(times)
+    curves = np.concatenate(curves)
+    values = np.concatenate(values)
+
+    order = np.lexsort((curves, times))
+    times, curves, values = times[order], curves[order], values[order]
+    found, starts = np.unique(times, return_index=True)
+    ends = list(starts[1:]) + [len(times)]
+
+    keys = {}
+    for frame, start, end in zip(found, starts, ends):
+        keys[int(frame)] = zlib.crc32(curves[start:end].tobytes() + values[start:end].tobytes())
+    return keys
+
+def check_keys(scene, queue=True):
+    """Queue the poses whose keys changed since they were last read"""
+    action = get_action(scene)
+    if action == None:
+        _pose_keys.pop(scene.name, None)
+        return
+
+    poses = get_pose_frames(scene)
+    frames = set(poses)
+    keys = read_pose_keys(action, frames)
+    old = _pose_keys.get(scene.name)
+    _pose_keys[scene.name] = (frames, keys)
+
+    # the first read, or the poses moved to other frames, so there's nothing to compare against
+    if not queue or old == None or old[0] != frames:
+        return
+
+    for frame, pose in poses.items():
+        if keys.get(frame) != old[1].get(frame):
+            queue_pose(scene, *pose)
+
+def queue_pose(scene, category_uid, pose_uid):
+    if scene.name in _rebuild_all:
+        return
+
+    key = (scene.name, category_uid, pose_uid)
+    if key in _queue:
+        _queue.move_to_end(key)
+        return
+
+    if len(_queue) >= QUEUE_LIMIT:
+        # too many poses changed at once, rebuild everything in one go
+        for queued in [queued for queued in _queue if queued[0] == scene.name]:
+            del _queue[queued]
+        _rebuild_all.add(scene.name)
+        return
+
+    _queue[key] = None
+
+def find_pose_frame(scene, category_uid, pose_uid):
+    """Returns the frame of a pose from its IDs, or None if it was removed"""
+    for marker in scene.timeline_markers:
+        if marker.category_uid != category_uid:
+            continue
+        for p, pose in enumerate(marker.poses):
+            if pose.uid == pose_uid:
+                return library_core.pose_frame(marker, p, scene.pose_increments)
+    return None
+
+def rebuild(scene, **scope):
+    """Rebuild part of the library quietly, leaving the frame and bone selection where they were"""
+    global _building
+
+    window, area = library_template_UI.find_view3d(bpy.context)
+    if window == None:
+        return False
+
+    # the build selects every bone, so put the user's selection back afterwards
+    rig = library_template_UI.get_rig(bpy.context)
+    arm = rig.data if rig and rig.type == 'ARMATURE' else None
+    if arm:
+        selected = rig_topology.get_selection(arm)
+        active = arm.bones.active
+
+    frame = scene.frame_current
+    _building = True
+    try:
+        # the selection stays on the pose being edited
+        with library_template_UI.suspend_updates(refresh=False):
+            with bpy.context.temp_override(window=window, area=area, scene=scene):
+                if not bpy.ops.pose.create_pose_library.poll():
+                    return False
+                bpy.ops.pose.create_pose_library(quiet=True, **scope)
+            scene.frame_set(frame)
+
+        # mirroring keys the template, so read the keys again without queueing them
+        check_keys(scene, queue=False)
+    finally:
+        if arm:
+            rig_topology.set_selection(arm, selected)
+            arm.bones.active = active
+        _building = False
+    return True
+
+def live_timer():
+    """Rebuild the edited poses once editing has stopped, one pose per call"""
+    idle = time.monotonic() - _last_edit
+    if idle < IDLE_DELAY:
+        return IDLE_DELAY - idle
+
+    while _changed:
+        scene = bpy.data.scenes.get(_changed.pop())
+        if scene and scene.pose_library_live:
+            check_keys(scene)
+
+    if _rebuild_all:
+        scene_name = next(iter(_rebuild_all))
+        scene = bpy.data.scenes.get(scene_name)
+        if scene and not rebuild(scene, scope='ALL'):
+            # not in pose mode yet, try again later
+            return IDLE_DELAY
+        _rebuild_all.discard(scene_name)
+        return REBUILD_INTERVAL
+
+    if _queue:
+        scene_name, category_uid, pose_uid = next(iter(_queue))
+        scene = bpy.data.scenes.get(scene_name)
+        frame = find_pose_frame(scene, category_uid, pose_uid) if scene else None
+        if frame != None and not rebuild(scene, scope='FRAMES', frame_start=frame, frame_end=frame):
+            return IDLE_DELAY
+        _queue.pop((scene_name, category_uid, pose_uid), None)
+        return REBUILD_INTERVAL
+
+    # don't repeat
+    return None
+
+def restart_timer():
+    global _last_edit
+    _last_edit = time.monotonic()
+    if not bpy.app.timers.is_registered(live_timer):
+        bpy.app.timers.register(live_timer, first_interval=IDLE_DELAY)
+
+def clear(scene_name=None):
+    for key in [key for key in _queue if scene_name in (None, key[0])]:
+        del _queue[key]
+    if scene_name == None:
+        _rebuild_all.clear()
+        _pose_keys.clear()
+        _changed.clear()
+    else:
+        _rebuild_all.discard(scene_name)
+        _pose_keys.pop(scene_name, None)
+        _changed.discard(scene_name)
+
+def update_live(self, context):
+    """Start watching the pose keys of the scene, or stop"""
+    if self.pose_library_live:
+        check_keys(self, queue=False)
+    else:
+        clear(self.name)
+
+
+@persistent
+def depsgraph_handler(scene, depsgraph=None):
+    """Note that the keys of the rig's action changed"""
+    if _building or depsgraph is None or not scene.pose_library_live:
+        return
+
+    action = get_action(scene)
+    if action == None:
+        return
+
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Action) and update.id.original == action:
+            _changed.add(scene.name)
+            restart_timer()
+            return
+
+@persistent
+def frame_change_handler(scene, depsgraph=None):
+    """Wait for scrubbing to stop before rebuilding, since a rebuild changes the frame"""
+    if _building or not scene.pose_library_live:
+        return
+
+    if _changed or _queue or _rebuild_all:
+        restart_timer()
+
+@persistent
+def load_post_handler(dummy):
+    clear()
+    for scene in bpy.data.scenes:
+        if scene.pose_library_live:
+            check_keys(scene, queue=False)
+
+
+def register():
+    bpy.types.Scene.pose_library_live = BoolProperty(
+        name = "Live Library",
+        description = "Rebuild the assets of edited poses automatically once editing stops",
+        default = False,
+        update = update_live
+    )
+
+    bpy.app.handlers.depsgraph_update_post.append(depsgraph_handler)
+    bpy.app.handlers.frame_change_post.append(frame_change_handler)
+    bpy.app.handlers.load_post.append(load_post_handler)
+
+def unregister():
+    if depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(depsgraph_handler)
+    if frame_change_handler in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.remove(frame_change_handler)
+    if load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_post_handler)
+    if bpy.app.timers.is_registered(live_timer):
+        bpy.app.timers.unregister(live_timer)
+    clear()
+
+    del bpy.types.Scene.pose_library_live
+
+if __name__ == '__main__':
+    register()
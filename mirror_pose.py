@@ -2,13 +2,68 @@
 # SPDX-License-Identifier: MIT
 
 import bpy
+import numpy as np
 from bpy.types import Panel, PropertyGroup, Scene
 from bpy.props import (
     IntProperty,
     BoolProperty,
+    EnumProperty,
     )
 from bpy.app.handlers import persistent # Add handler to ensure code runs after Blender launches
 
+from . import library_template_UI, pose_cache, rig_topology
+
+
+# Sign of each channel when a pose is flipped to the other side, the same
+# as pasting a pose flipped: mirror on X, so flip the Y and Z rotations.
+FLIP = {
+    'location': (-1, 1, 1),
+    'rotation_quaternion': (1, 1, -1, -1),
+    'rotation_euler': (1, -1, -1),
+    'rotation_axis_angle': (1, 1, -1, -1),
+    'scale': (1, 1, 1),
+}
+
+
+def read_keys(points):
+    """Returns the frame and value of every key as an array of pairs"""
+    co = np.empty(len(points) * 2, dtype=np.float32)
+    points.foreach_get('co', co)
+    return co.reshape(-1, 2)
+
+def in_frames(times, start, end, frames=None):
+    """Returns True for every time between start and end, and on one of the frames if given"""
+    found = (times >= start) & (times <= end)
+    if frames is not None:
+        found &= np.isin(times, frames)
+    return found
+
+def write_keys(fcurve, co, interpolation, start, end, frames=None):
+    """Replace the keys of an F-Curve between start and end, in one pass.
+
+    If frames are given, only the keys on those frames are replaced."""
+    points = fcurve.keyframe_points
+
+    # remove the old keys in the range, from the end so the indices stay valid
+    old = read_keys(points)
+    for i in reversed(np.flatnonzero(in_frames(old[:, 0], start, end, frames))):
+        points.remove(points[int(i)], fast=True)
+
+    # add the new keys at the end, update() sorts them into place
+    first = len(points)
+    points.add(len(co))
+
+    for prop in ('co', 'handle_left', 'handle_right'):
+        values = np.empty(len(points) * 2, dtype=np.float32)
+        points.foreach_get(prop, values)
+        values[first * 2:] = co.ravel()
+        points.foreach_set(prop, values)
+
+    for i, mode in enumerate(interpolation):
+        points[first + i].interpolation = mode
+
+    fcurve.update()
+
 
 # Create an opperator to mirror the controls in a selected layer over a series of frames
 #
@@ -40,6 +95,23 @@ class mirror_pose(bpy.types.Operator):
         default = False
     )
 
+    # which frames of the range to mirror when stepping through it
+    frames: EnumProperty(
+        name = "Frames",
+        items = (('ALL', 'All Frames', "Mirror every frame in the range"),
+                 ('KEYED', 'Keyed Frames', "Only mirror the frames where the layer's controls have keys"),
+                 ('CATEGORY', 'Category Poses', "Only mirror the pose frames of the active category")),
+        default = 'ALL'
+    )
+
+    # mirror the keys of a range straight from the F-Curves,
+    # instead of stepping through every frame
+    bulk: BoolProperty(
+        name = "Mirror Keys",
+        description = "Mirror the keys in the range straight from the F-Curves instead of copying and pasting every frame.",
+        default = True
+    )
+
     # Only let this operataor exist if we're in POSE mode.
     @classmethod
     def poll(cls, context):
@@ -77,30 +149,132 @@ class mirror_pose(bpy.types.Operator):
 
         bone = o.data.bones[selected]
 
+        # the visible bones sharing a layer with the selected one, and
+        # their mirrored controls, don't change from frame to frame
+        arm = o.data
+        topology = rig_topology.get_topology(arm)
+        layer_bones = topology.in_layers(topology.layer_masks[topology.index[selected]], topology.visible(arm))
+        mirror_bones = topology.mirrored(layer_bones)
+
+        names = {topology.names[i] for i in layer_bones}
+
+        if self.range and self.bulk:
+            return self.mirrorKeys(context, o, names, topology)
+
+        with library_template_UI.suspend_updates(refresh=False):
+            self.mirrorFrames(context, o, bone, names, layer_bones, mirror_bones)
+
+        # success
+
+        return {'FINISHED'}
+
+    def mirrorFrames(self, context, o, bone, names, layer_bones, mirror_bones):
+        """Paste the pose flipped on every frame, one frame at a time"""
+        arm = o.data
         pose = bpy.ops.pose
-        for i in range(self.start_frame, self.end_frame+1):
+        for i in self.getFrames(context, o, names):
             context.scene.frame_set(i)
 
             # select all bones in layer
-            pose.select_grouped(type='LAYER')
+            rig_topology.set_selection(arm, layer_bones)
 
             # copy the pose
             pose.copy()
 
             # select the mirrored controls
-            pose.select_mirror()
+            rig_topology.set_selection(arm, mirror_bones)
 
             # paste the pose
             pose.paste(flipped=True)
 
             # clear the selection
-            bpy.ops.pose.select_all(action='DESELECT')
+            rig_topology.set_selection(arm, [])
 
             # select the original
             bone.select=True
             o.data.bones.active = bone
 
-        # success
+    def getCategoryFrames(self, context):
+        """Returns the pose frames of the active category"""
+        scene = context.scene
+        markers = scene.timeline_markers
+        if not markers:
+            return np.array([], dtype=np.float32)
+
+        marker = markers[scene.category_active_index]
+        return np.array([marker.frame + p * scene.pose_increments for p in range(len(marker.poses))],
+            dtype=np.float32)
+
+    def getFrames(self, context, o, names):
+        """Returns the frames of the range to step through"""
+        start, end = self.start_frame, self.end_frame
+        if not self.range or self.frames == 'ALL':
+            return range(start, end+1)
+
+        if self.frames == 'CATEGORY':
+            frames = self.getCategoryFrames(context)
+            return [int(frame) for frame in frames[in_frames(frames, start, end)]]
+
+        # the union of the key times of the layer's controls
+        action = o.animation_data.action if o.animation_data else None
+        if action == None:
+            return []
+
+        times = [read_keys(fcurve.keyframe_points)[:, 0] for fcurve in action.fcurves
+            if self.getBone(fcurve) in names]
+        if not times:
+            return []
+        times = np.unique(np.concatenate(times))
+        return [int(round(time)) for time in times[in_frames(times, start, end)]]
+
+    def getBone(self, fcurve):
+        """Returns the name of the bone an F-Curve animates, or None"""
+        match = pose_cache.BONE_PATH.match(fcurve.data_path)
+        return match.group(1) if match else None
+
+    def mirrorKeys(self, context, o, names, topology):
+        """Mirror the keys in the range from each bone onto its mirrored bone"""
+        action = o.animation_data.action if o.animation_data else None
+        if action == None:
+            self.report({'WARNING'}, 'The rig has no action to mirror.')
+            return {'CANCELLED'}
+
+        frames = None
+        if self.frames == 'CATEGORY':
+            frames = self.getCategoryFrames(context)
+
+        # read every source first, since left and right may swap with each other
+        mirrored = {}
+        for fcurve in action.fcurves:
+            match = pose_cache.BONE_PATH.match(fcurve.data_path)
+            if not match or match.group(1) not in names or match.group(2) not in FLIP:
+                continue
+            name, prop = match.groups()
+
+            # bones in the middle, or without a match, stay as they are
+            target = topology.pairs.get(topology.index[name])
+            if target == None:
+                continue
+
+            points = fcurve.keyframe_points
+            co = read_keys(points)
+            in_range = np.flatnonzero(in_frames(co[:, 0], self.start_frame, self.end_frame, frames))
+            if not len(in_range):
+                continue
+
+            co = co[in_range]
+            co[:, 1] *= FLIP[prop][fcurve.array_index]
+            interpolation = [points[int(i)].interpolation for i in in_range]
+
+            mirrored[(topology.names[target], prop, fcurve.array_index)] = (co, interpolation)
+
+        # now write them onto the mirrored bones
+        for (target, prop, index), (co, interpolation) in mirrored.items():
+            path = f'pose.bones["{bpy.utils.escape_identifier(target)}"].{prop}'
+            fcurve = action.fcurves.find(path, index=index)
+            if fcurve == None:
+                fcurve = action.fcurves.new(path, index=index, action_group=target)
+            write_keys(fcurve, co, interpolation, self.start_frame, self.end_frame, frames)
 
         return {'FINISHED'}
 
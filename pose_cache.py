@@ -0,0 +1,202 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import re
+
+import bpy
+import numpy as np
+from bpy.types import Operator
+from bpy.props import FloatProperty, IntProperty
+from bpy.app.handlers import persistent # Add handler to ensure code runs after Blender launches
+
+
+# Pose bone properties that make up a pose
+CHANNELS = ('location', 'rotation_quaternion', 'rotation_euler', 'rotation_axis_angle', 'scale')
+
+# Matches F-Curve paths such as pose.bones["hand.L"].location
+BONE_PATH = re.compile(r'pose\.bones\["(.+)"\]\.(\w+)$')
+
+# Sampled poses, keyed by action name and then by category marker
+_pose_cache = {}
+
+
+class CategoryPoses():
+    """The sampled bone transforms of every pose in a category.
+
+    values holds one row per pose and one column per animated channel.
+    groups maps each bone property to its columns, so a pose is written
+    one vector at a time."""
+
+    __slots__ = ('signature', 'values', 'groups')
+
+    def __init__(self, action, frames, signature):
+        self.signature = signature
+
+        columns = {}
+        curves = []
+        for fcurve in action.fcurves:
+            match = BONE_PATH.match(fcurve.data_path)
+            if not match or match.group(2) not in CHANNELS:
+                continue
+            key = (match.group(1), match.group(2))
+            columns.setdefault(key, []).append((fcurve.array_index, len(curves)))
+            curves.append(fcurve)
+
+        self.values = np.empty((len(frames), len(curves)), dtype=np.float32)
+        for c, fcurve in enumerate(curves):
+            self.values[:, c] = [fcurve.evaluate(frame) for frame in frames]
+
+        self.groups = [(bone, prop, tuple(columns[(bone, prop)])) for bone, prop in columns]
+
+    def pose(self, pose_index, blend_index=-1, factor=0.0):
+        """Returns the values of a pose, optionally blended towards another one"""
+        row = self.values[pose_index]
+        if blend_index < 0 or factor <= 0.0:
+            return row
+        return row + (self.values[blend_index] - row) * factor
+
+    def apply(self, obj, row):
+        """Write the values straight onto the pose bones"""
+        bones = obj.pose.bones
+        for bone_name, prop, columns in self.groups:
+            pose_bone = bones.get(bone_name)
+            if not pose_bone:
+                continue
+
+            vector = getattr(pose_bone, prop)
+            for index, column in columns:
+                vector[index] = row[column]
+
+            # blending quaternions component by component needs them normalized again
+            if prop == 'rotation_quaternion':
+                vector.normalize()
+
+
+def get_category_poses(obj, marker, pose_increments):
+    """Returns the sampled poses of a category, sampling them if needed"""
+    animation_data = obj.animation_data
+    if not animation_data or not animation_data.action:
+        return None
+    action = animation_data.action
+
+    signature = (obj.as_pointer(), marker.frame, pose_increments, len(marker.poses))
+    cached = _pose_cache.setdefault(action.name_full, {})
+    entry = cached.get(marker.as_pointer())
+    if entry and entry.signature == signature:
+        return entry
+
+    frames = [marker.frame + p * pose_increments for p in range(len(marker.poses))]
+    entry = CategoryPoses(action, frames, signature)
+    cached[marker.as_pointer()] = entry
+    return entry
+
+
+def preview_pose(obj, marker, pose_index, pose_increments, blend_index=-1, factor=0.0):
+    """Show a pose of a category without changing the frame.
+
+    Returns False if the rig has no action to sample the pose from."""
+    if pose_index >= len(marker.poses):
+        return False
+
+    entry = get_category_poses(obj, marker, pose_increments)
+    if not entry:
+        return False
+
+    entry.apply(obj, entry.pose(pose_index, blend_index, factor))
+    return True
+
+
+def clear_cache():
+    _pose_cache.clear()
+
+
+class POSE_OT_PreviewPose(Operator):
+    """Preview a pose from the cache without changing the frame"""
+    bl_idname = "pose.preview_cached_pose"
+    bl_label = "Preview Pose"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    pose_index : IntProperty(
+        name = "Pose",
+        description = "Index of the pose in the active category",
+        min = 0
+    )
+
+    blend_index : IntProperty(
+        name = "Blend Pose",
+        description = "Index of the pose to blend towards. -1 to not blend",
+        default = -1,
+        min = -1
+    )
+
+    factor : FloatProperty(
+        name = "Factor",
+        description = "How far to blend towards the blend pose",
+        default = 0.5,
+        min = 0.0,
+        max = 1.0,
+        subtype = 'FACTOR'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'POSE' and len(context.scene.timeline_markers) > 0)
+
+    def execute(self, context):
+        scene = context.scene
+        marker = scene.timeline_markers[scene.category_active_index]
+
+        if self.blend_index >= len(marker.poses):
+            self.report({'WARNING'}, "The blend pose doesn't exist.")
+            return {'CANCELLED'}
+
+        if not preview_pose(context.pose_object, marker, self.pose_index, scene.pose_increments,
+                self.blend_index, self.factor):
+            self.report({'WARNING'}, "The pose could not be found in the rig's action.")
+            return {'CANCELLED'}
+
+        return {'FINISHED'}
+
+
+@persistent
+def depsgraph_handler(scene, depsgraph=None):
+    """Drop the sampled poses of actions that were edited"""
+    if not _pose_cache or depsgraph is None:
+        return
+
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Action):
+            _pose_cache.pop(update.id.name_full, None)
+
+
+@persistent
+def load_post_handler(dummy):
+    clear_cache()
+
+
+classes = [
+    POSE_OT_PreviewPose,
+]
+
+def register():
+
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+    bpy.app.handlers.depsgraph_update_post.append(depsgraph_handler)
+    bpy.app.handlers.load_post.append(load_post_handler)
+
+def unregister():
+
+    classes.reverse()
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+
+    if depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(depsgraph_handler)
+    if load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_post_handler)
+    clear_cache()
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,178 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import bpy
+import numpy as np
+from bpy.types import Operator
+from bpy.props import EnumProperty, FloatProperty
+
+from . import library_template_UI, pose_cache
+
+
+# Most channel differences worked out at once, about 16 MB of float32
+CHUNK_SIZE = 1 << 22
+
+
+def sample_poses(obj, scene):
+    """Returns the channels of every pose that isn't skipped, one row per pose,
+    and the category and pose index of each row"""
+    rows = []
+    labels = []
+    for m, marker in enumerate(scene.timeline_markers):
+        entry = pose_cache.get_category_poses(obj, marker, scene.pose_increments)
+        if entry == None:
+            return None, []
+
+        for p, pose in enumerate(marker.poses):
+            if not pose.skip:
+                rows.append(entry.values[p])
+                labels.append((m, p))
+
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32), labels
+    return np.vstack(rows), labels
+
+def near_pairs(values, tolerance):
+    """Yields the pairs of rows whose channels all differ by no more than the tolerance.
+
+    Rows are compared against all the others a block at a time, so memory
+    stays bounded however many poses there are."""
+    count, width = values.shape
+    if width == 0:
+        return
+
+    block = max(1, CHUNK_SIZE // (count * width))
+    for start in range(0, count, block):
+        chunk = values[start:start + block]
+        distance = np.abs(chunk[:, None, :] - values[None, :, :]).max(axis=2)
+        rows, cols = np.nonzero(distance <= tolerance)
+        rows += start
+
+        # each pair once
+        later = cols > rows
+        yield from zip(rows[later].tolist(), cols[later].tolist())
+
+def cluster(count, pairs):
+    """Returns the groups of rows joined by the pairs, leaving out rows on their own"""
+    parent = list(range(count))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs:
+        a, b = root(a), root(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for i in range(count):
+        groups.setdefault(root(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class POSE_OT_FindDuplicates(Operator):
+    """Find poses that are nearly the same as another pose"""
+    bl_idname = "pose.find_duplicates"
+    bl_label = "Find Duplicate Poses"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    tolerance: FloatProperty(
+        name = "Tolerance",
+        description = "Largest difference in any channel for two poses to count as the same",
+        default = 0.001,
+        min = 0.0,
+        precision = 4
+    )
+
+    action: EnumProperty(
+        name = "Action",
+        items = (('REPORT', 'Report', "Only list the duplicates"),
+                 ('SKIP', 'Skip', "Skip every duplicate but the first pose of each group"),
+                 ('MERGE', 'Merge', "Skip the duplicates and add their names to the description of the pose that is kept")),
+        default = 'REPORT'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (len(context.scene.timeline_markers) > 0)
+
+    def execute(self, context):
+        scene = context.scene
+        obj = library_template_UI.get_rig(context)
+        if obj == None:
+            self.report({'WARNING'}, "There is no rig to sample the poses from.")
+            return {'CANCELLED'}
+
+        values, labels = sample_poses(obj, scene)
+        if values is None:
+            self.report({'WARNING'}, "The rig has no action to sample the poses from.")
+            return {'CANCELLED'}
+
+        groups = cluster(len(labels), near_pairs(values, self.tolerance))
+
+        markers = scene.timeline_markers
+        lines = []
+        duplicates = 0
+        for group in groups:
+            poses = [(markers[labels[i][0]], labels[i][1]) for i in group]
+            lines.append(", ".join(f"{marker.name} - {marker.poses[p].name}" for marker, p in poses))
+            duplicates += len(poses) - 1
+
+            if self.action != 'REPORT':
+                self.skipDuplicates(poses)
+
+        if self.action != 'REPORT':
+            library_template_UI.touch_library()
+
+        message = f"{duplicates} duplicate pose(s) in {len(groups)} group(s).\n"
+        if self.action == 'SKIP':
+            message += "The duplicates are now skipped.\n"
+        elif self.action == 'MERGE':
+            message += "The duplicates are now skipped and listed in the description of the pose kept.\n"
+        if lines:
+            message += "\n" + "\n".join(lines[:20])
+        if len(lines) > 20:
+            message += f"\n...and {len(lines) - 20} more."
+
+        print(message)
+        bpy.ops.wm.message_box('INVOKE_DEFAULT',
+            message = message,
+            title = "Duplicate Poses")
+        return {'FINISHED'}
+
+    def skipDuplicates(self, poses):
+        """Keep the first pose of a group and skip the others"""
+        marker, p = poses[0]
+        kept = marker.poses[p]
+
+        names = []
+        for marker, p in poses[1:]:
+            duplicate = marker.poses[p]
+            duplicate.skip = True
+            names.append(f"{marker.name} - {duplicate.name}")
+
+        if self.action == 'MERGE':
+            merged = "Also: " + ", ".join(names)
+            kept.description = f"{kept.description} {merged}".strip()
+
+
+classes = [
+    POSE_OT_FindDuplicates,
+]
+
+def register():
+
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+
+    classes.reverse()
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,222 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+
+import bpy
+from bpy.types import Operator
+from bpy.props import EnumProperty, IntProperty, StringProperty
+
+from . import asset_index, library_core, library_template_UI, mirror_pose
+
+
+# Script each background Blender runs. It renders its share of the poses
+# from their category cameras, reading the jobs from the file after "--".
+WORKER_SCRIPT = '''
+import json
+import sys
+
+import bpy
+
+with open(sys.argv[sys.argv.index("--") + 1]) as f:
+    jobs = json.load(f)
+
+scene = bpy.context.scene
+render = scene.render
+render.engine = jobs["engine"]
+render.resolution_x = jobs["resolution"]
+render.resolution_y = jobs["resolution"]
+render.resolution_percentage = 100
+render.film_transparent = True
+render.image_settings.file_format = "PNG"
+if render.engine == "CYCLES":
+    scene.cycles.device = "CPU"
+    scene.cycles.samples = jobs["samples"]
+
+for job in jobs["poses"]:
+    scene.camera = bpy.data.objects[job["camera"]]
+    scene.frame_set(job["frame"])
+    render.filepath = job["path"]
+    bpy.ops.render.render(write_still=True)
+'''
+
+
+def pose_hash(action, camera, settings):
+    """Returns a key for the preview of a pose, from its keys and the camera looking at it"""
+    digest = hashlib.sha1()
+    for fcurve in action.fcurves:
+        digest.update(f"{fcurve.data_path}[{fcurve.array_index}]".encode())
+        digest.update(mirror_pose.read_keys(fcurve.keyframe_points).tobytes())
+
+    digest.update(repr([value for row in camera.matrix_world for value in row]).encode())
+    digest.update(repr((camera.data.lens, camera.data.ortho_scale, camera.data.type)).encode())
+    digest.update(repr(settings).encode())
+    return digest.hexdigest()
+
+def get_cache_dir(path):
+    """Returns the folder previews are cached in, making it if needed"""
+    if bpy.data.filepath or not path.startswith("//"):
+        folder = bpy.path.abspath(path)
+    else:
+        # the file was never saved, so there's no folder to be relative to
+        folder = os.path.join(tempfile.gettempdir(), path[2:])
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+class POSE_OT_RenderPreviews(Operator):
+    """Render a preview of every generated pose from its category camera"""
+    bl_idname = "pose.render_previews"
+    bl_label = "Render Pose Previews"
+    bl_options = {'REGISTER'}
+
+    engine: EnumProperty(
+        name = "Engine",
+        items = (('BLENDER_WORKBENCH', 'Workbench', "Fast solid shading"),
+                 ('CYCLES', 'Cycles (CPU)', "Path traced on the CPU, for machines without a GPU")),
+        default = 'BLENDER_WORKBENCH'
+    )
+
+    resolution: IntProperty(
+        name = "Resolution",
+        description = "Width and height of the previews in pixels",
+        default = 256,
+        min = 32,
+        max = 1024
+    )
+
+    samples: IntProperty(
+        name = "Samples",
+        description = "Cycles samples per preview",
+        default = 16,
+        min = 1
+    )
+
+    workers: IntProperty(
+        name = "Workers",
+        description = "Number of background Blender processes rendering at once",
+        default = max(1, min(4, (os.cpu_count() or 1) // 2)),
+        min = 1
+    )
+
+    cache_dir: StringProperty(
+        name = "Cache Folder",
+        description = "Folder the rendered previews are kept in, so unchanged poses aren't rendered again",
+        default = "//pose_previews",
+        subtype = 'DIR_PATH'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (len(context.scene.timeline_markers) > 0)
+
+    def getJobs(self, context, folder):
+        """Returns the previews to show, and the ones of them that have to be rendered"""
+        scene = context.scene
+        settings = (self.engine, self.resolution, self.samples if self.engine == 'CYCLES' else 0)
+
+        # the poses a full build makes, skipped ones left out
+        markers = scene.timeline_markers
+        poses = {}
+        for m, p, frame in library_core.plan_build(markers, 'ALL', scene.pose_increments):
+            marker = markers[m]
+            origin = asset_index.make_origin(marker.category_uid, marker.poses[p].uid)
+            poses[origin] = (marker, frame)
+
+        jobs = []
+        for action in bpy.data.actions:
+            found = poses.get(action.get(asset_index.ORIGIN_KEY))
+            if not found or not action.asset_data:
+                continue
+
+            marker, frame = found
+            camera = marker.camera_pointer
+            if camera == None:
+                continue
+
+            path = os.path.join(folder, f"{pose_hash(action, camera, settings)}.png")
+            jobs.append({
+                'action': action.name,
+                'camera': camera.name,
+                'frame': frame,
+                'path': path,
+            })
+
+        return jobs, [job for job in jobs if not os.path.exists(job['path'])]
+
+    def renderJobs(self, jobs):
+        """Render the jobs, split between the background Blender processes"""
+        tempdir = tempfile.gettempdir()
+        blendfile = library_template_UI.save_tempfile()
+
+        script = os.path.join(tempdir, "pose_previews.py")
+        with open(script, "w") as f:
+            f.write(WORKER_SCRIPT)
+
+        processes = []
+        for i in range(min(self.workers, len(jobs))):
+            jobfile = os.path.join(tempdir, f"pose_previews_{i}.json")
+            with open(jobfile, "w") as f:
+                json.dump({
+                    'engine': self.engine,
+                    'resolution': self.resolution,
+                    'samples': self.samples,
+                    'poses': jobs[i::self.workers],
+                }, f)
+
+            processes.append(subprocess.Popen([bpy.app.binary_path, "--background", blendfile,
+                "--python", script, "--", jobfile], stdout=subprocess.DEVNULL))
+
+        for process in processes:
+            process.wait()
+
+    def loadPreviews(self, context, jobs):
+        """Load the rendered images as the previews of the pose assets"""
+        loaded = 0
+        for job in jobs:
+            action = bpy.data.actions.get(job['action'])
+            if action == None or not os.path.exists(job['path']):
+                continue
+
+            with context.temp_override(id=action):
+                bpy.ops.ed.lib_id_load_custom_preview(filepath=job['path'])
+            loaded += 1
+        return loaded
+
+    def execute(self, context):
+        folder = get_cache_dir(self.cache_dir)
+        jobs, to_render = self.getJobs(context, folder)
+
+        if not jobs:
+            self.report({'WARNING'}, "There are no generated poses with a category camera to preview.")
+            return {'CANCELLED'}
+
+        if to_render:
+            self.renderJobs(to_render)
+
+        loaded = self.loadPreviews(context, jobs)
+        self.report({'INFO'}, f"{loaded} preview(s) loaded, {len(to_render)} rendered, {len(jobs) - len(to_render)} from the cache.")
+        return {'FINISHED'}
+
+
+classes = [
+    POSE_OT_RenderPreviews,
+]
+
+def register():
+
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+
+    classes.reverse()
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,230 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import re
+
+import bpy
+from bpy.types import Operator, Panel
+from bpy.props import IntProperty, StringProperty
+
+from . import library_template_UI
+
+
+# Number of results to show in the search panel
+MAX_RESULTS = 20
+
+# Words are split on anything that isn't a letter or a number
+TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def tokenize(text):
+    """Returns the lower case words of a name or description"""
+    return [token for token in TOKEN_SPLIT.split(text.lower()) if token]
+
+
+class PoseSearchIndex():
+    """Prefix index over the names and descriptions of every pose in every category.
+
+    Each category is indexed on its own, so when the library changes only the
+    categories whose poses changed are indexed again."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.version = None
+        self.categories = {}   # category index -> (signature, keys)
+        self.prefixes = {}     # word prefix -> set of keys
+        self.labels = {}       # key -> (category name, pose name)
+        self.tokens = {}       # key -> words of the pose
+        self.ranked = {}       # word prefix -> its keys in order, sorted when first searched
+
+    def sync(self, scene):
+        """Bring the index up to date with the categories of the scene"""
+        version = library_template_UI._library_version
+        if version == self.version:
+            return
+        self.version = version
+
+        markers = scene.timeline_markers
+        for m, marker in enumerate(markers):
+            poses = tuple((pose.name, pose.description) for pose in marker.poses)
+            signature = (marker.name, marker.category_order, poses)
+
+            indexed = self.categories.get(m)
+            if indexed and indexed[0] == signature:
+                continue
+
+            if indexed:
+                self.remove(indexed[1])
+            self.categories[m] = (signature, self.add(m, marker, poses))
+
+        # categories that were removed
+        for m in [m for m in self.categories if m >= len(markers)]:
+            self.remove(self.categories.pop(m)[1])
+
+    def add(self, m, marker, poses):
+        """Index the poses of a category and return their keys"""
+        keys = []
+        category_tokens = tokenize(marker.name)
+        for p, (name, description) in enumerate(poses):
+            # keys sort the results in the same order as the timeline
+            key = (marker.category_order, p, m)
+            keys.append(key)
+            self.labels[key] = (marker.name, name)
+
+            tokens = set(category_tokens + tokenize(name) + tokenize(description))
+            self.tokens[key] = tokens
+            for token in tokens:
+                for i in range(1, len(token) + 1):
+                    self.prefixes.setdefault(token[:i], set()).add(key)
+                    self.ranked.pop(token[:i], None)
+        return keys
+
+    def remove(self, keys):
+        """Remove the poses of a category from the index"""
+        for key in keys:
+            del self.labels[key]
+            for token in self.tokens.pop(key):
+                for i in range(1, len(token) + 1):
+                    self.ranked.pop(token[:i], None)
+                    found = self.prefixes[token[:i]]
+                    found.discard(key)
+                    if not found:
+                        del self.prefixes[token[:i]]
+
+    def search(self, text, limit=MAX_RESULTS):
+        """Returns the keys of the poses matching every word of the text"""
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+
+        # walk the smallest set of matches in order, and stop once there are enough
+        tokens = sorted(set(tokens), key=lambda token: len(self.prefixes.get(token, ())))
+        others = [self.prefixes.get(token, ()) for token in tokens[1:]]
+
+        found = []
+        for key in self.ranking(tokens[0]):
+            if all(key in other for other in others):
+                found.append(key)
+                if len(found) == limit:
+                    break
+        return found
+
+    def ranking(self, prefix):
+        """Returns the keys of a word prefix in order, sorting them the first time"""
+        ranked = self.ranked.get(prefix)
+        if ranked is None:
+            ranked = sorted(self.prefixes.get(prefix, ()))
+            self.ranked[prefix] = ranked
+        return ranked
+
+    def label(self, key):
+        return self.labels[key]
+
+
+# The index shared by the search panel and the search operator
+search_index = PoseSearchIndex()
+
+
+class POSE_OT_GoToSearchResult(Operator):
+    """Select the category and pose found by the search"""
+    bl_idname = "category.go_to_search_result"
+    bl_label = "Go to Pose"
+    bl_options = {'REGISTER'}
+
+    category_index : IntProperty(
+        name = "Category Index",
+        options = {'HIDDEN'}
+    )
+
+    pose_index : IntProperty(
+        name = "Pose Index",
+        options = {'HIDDEN'}
+    )
+
+    def execute(self, context):
+        scene = context.scene
+        markers = scene.timeline_markers
+
+        if self.category_index >= len(markers):
+            self.report({'WARNING'}, "That category no longer exists.")
+            return {'CANCELLED'}
+
+        marker = markers[self.category_index]
+        if self.pose_index >= len(marker.poses):
+            self.report({'WARNING'}, "That pose no longer exists.")
+            return {'CANCELLED'}
+
+        scene.category_active_index = self.category_index
+        marker.pose_active_index = self.pose_index
+
+        return {'FINISHED'}
+
+
+class VIEW3D_PT_FP_libSearchUI(Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "Pose Library"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    bl_label = "Search Poses"
+
+    @classmethod
+    def poll(cls, context):
+        # only work if timeline markers exist
+        return (len(context.scene.timeline_markers) > 0)
+
+    def draw(self, context):
+        layout = self.layout
+        wm = context.window_manager
+
+        layout.prop(wm, "pose_search", text="", icon='VIEWZOOM')
+
+        if not wm.pose_search.strip():
+            return
+
+        search_index.sync(context.scene)
+        results = search_index.search(wm.pose_search)
+
+        if not results:
+            layout.label(text="No poses found.", icon='INFO')
+            return
+
+        col = layout.column(align=True)
+        for key in results:
+            order, p, m = key
+            category, name = search_index.label(key)
+            op = col.operator('category.go_to_search_result', text=f"{category} - {name}", icon='ARMATURE_DATA')
+            op.category_index = m
+            op.pose_index = p
+
+
+classes = [
+    POSE_OT_GoToSearchResult,
+    VIEW3D_PT_FP_libSearchUI,
+]
+
+def register():
+
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+    bpy.types.WindowManager.pose_search = StringProperty(
+        name = "Search Poses",
+        description = "Find poses in every category by name or description",
+        default = "",
+        options = {'TEXTEDIT_UPDATE'}
+    )
+
+def unregister():
+
+    classes.reverse()
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+
+    del bpy.types.WindowManager.pose_search
+    search_index.clear()
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,177 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent # Add handler to ensure code runs after Blender launches
+
+from .library_core import match_ignore, mirror_map, mirror_pairs
+
+
+# Bit of each of the 32 armature layers
+LAYER_BITS = np.left_shift(np.uint64(1), np.arange(32, dtype=np.uint64))
+
+# Sign of each side in the sides array
+SIDES = {'L': 1, 'R': -1}
+
+# Topology of each armature, keyed by armature
+_topologies = {}
+
+# Armatures that changed since their topology was read, and how
+_dirty = {}
+
+
+def layer_mask(layers):
+    """Returns the 32 bit mask of a list of layer indices or of 32 booleans"""
+    if len(layers) == 32 and all(isinstance(layer, bool) for layer in layers):
+        layers = [i for i, on in enumerate(layers) if on]
+    mask = 0
+    for layer in layers:
+        mask |= 1 << layer
+    return mask
+
+
+class RigTopology():
+    """Bone lookups of an armature, worked out once.
+
+    Holds a bone name to index table, the parent and mirrored bone of every
+    bone, the bones that have a bone on the other side, the side it is on and a 32 bit mask of the layers it is in, so
+    selection, ignore and mirror logic run on arrays instead of names."""
+
+    __slots__ = ('names', 'index', 'parents', 'sides', 'mirror', 'pairs', 'layer_masks', 'patterns')
+
+    def __init__(self, arm):
+        bones = arm.bones
+        self.names = [bone.name for bone in bones]
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        self.parents = np.array([self.index[bone.parent.name] if bone.parent else -1 for bone in bones],
+            dtype=np.int32)
+
+        # bones in the middle mirror onto themselves
+        sides, mirror = mirror_map(self.names)
+        self.sides = np.array([SIDES.get(side, 0) for side in sides], dtype=np.int8)
+        self.mirror = np.array(mirror, dtype=np.int32)
+        self.pairs = mirror_pairs(mirror)
+
+        self.patterns = {}
+        self.read_layers(arm)
+
+    def read_layers(self, arm):
+        """Read the layers of every bone into a mask per bone"""
+        flags = np.zeros(len(self.names) * 32, dtype=bool)
+        arm.bones.foreach_get('layers', flags)
+        masks = (flags.reshape(-1, 32) * LAYER_BITS).sum(axis=1)
+        self.layer_masks = masks.astype(np.uint32)
+
+    def find(self, names):
+        """Returns the indices of the bones with the given names that exist"""
+        return np.array([self.index[name] for name in names if name in self.index], dtype=np.int32)
+
+    def matching(self, patterns):
+        """Returns the indices of the bones whose name fully matches one of the regular expressions"""
+        key = tuple(patterns)
+        found = self.patterns.get(key)
+        if found is None:
+            found = np.array(match_ignore(self.names, patterns), dtype=np.int32)
+            self.patterns[key] = found
+        return found
+
+    def visible(self, arm):
+        """Returns a boolean per bone, True if it is in a visible layer and not hidden"""
+        hidden = np.zeros(len(self.names), dtype=bool)
+        arm.bones.foreach_get('hide', hidden)
+        return ((self.layer_masks & layer_mask(arm.layers[:])) != 0) & ~hidden
+
+    def in_layers(self, mask, visible=None):
+        """Returns the indices of the bones in any of the layers of the mask"""
+        found = (self.layer_masks & np.uint32(mask)) != 0
+        if visible is not None:
+            found &= visible
+        return np.flatnonzero(found)
+
+    def side(self, side, visible=None):
+        """Returns the indices of the bones on the 'L' or 'R' side"""
+        found = self.sides == SIDES[side.upper()]
+        if visible is not None:
+            found &= visible
+        return np.flatnonzero(found)
+
+    def mirrored(self, indices):
+        """Returns the indices of the bones on the other side.
+
+        Bones without a mirrored bone are left out, like select_mirror does."""
+        indices = np.asarray(indices, dtype=np.int32)
+        mirror = self.mirror[indices]
+        return np.unique(mirror[mirror != indices])
+
+
+def get_topology(arm):
+    """Returns the topology of an armature, reading it again if its bones changed"""
+    key = arm.as_pointer()
+    topology = _topologies.get(key)
+    change = _dirty.pop(key, None)
+
+    if topology and len(arm.bones) == len(topology.names):
+        if not change:
+            return topology
+
+        # the armature changed, but if the bones are the same only re-read the layers
+        if change == 'LAYERS' and [bone.name for bone in arm.bones] == topology.names:
+            topology.read_layers(arm)
+            return topology
+
+    topology = RigTopology(arm)
+    _topologies[key] = topology
+    return topology
+
+def get_selection(arm):
+    """Returns the indices of the selected bones, in one call"""
+    flags = np.zeros(len(arm.bones), dtype=bool)
+    arm.bones.foreach_get('select', flags)
+    return np.flatnonzero(flags)
+
+def set_selection(arm, indices):
+    """Select exactly the given bones, in one call"""
+    flags = np.zeros(len(arm.bones), dtype=bool)
+    flags[indices] = True
+    arm.bones.foreach_set('select', flags)
+
+
+@persistent
+def depsgraph_handler(scene, depsgraph=None):
+    """Flag the armatures whose bones may have changed"""
+    if not _topologies or depsgraph is None:
+        return
+
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Armature):
+            key = update.id.original.as_pointer()
+            if key not in _topologies:
+                continue
+            if update.is_updated_geometry:
+                _dirty[key] = 'BONES'
+            elif _dirty.get(key) != 'BONES':
+                _dirty[key] = 'LAYERS'
+
+
+@persistent
+def load_post_handler(dummy):
+    _topologies.clear()
+    _dirty.clear()
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(depsgraph_handler)
+    bpy.app.handlers.load_post.append(load_post_handler)
+
+def unregister():
+    if depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(depsgraph_handler)
+    if load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_post_handler)
+    _topologies.clear()
+    _dirty.clear()
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,67 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+"""
+Times the template logic on a large library, without Blender.
+
+    python tests/bench_library_core.py [categories] [poses per category]
+"""
+
+import importlib.util
+import os
+import sys
+import timeit
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location("library_core", os.path.join(ROOT, "library_core.py"))
+core = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(core)
+
+
+def make_library(category_count, pose_count):
+    categories = []
+    for order in range(category_count):
+        poses = [core.Pose(f"pose {p}", skip=(p % 7 == 0)) for p in range(pose_count)]
+        categories.append(core.Category(f"category {order}", frame=0, order=order, poses=poses))
+    return categories
+
+def bench(label, function, number):
+    best = min(timeit.repeat(function, number=number, repeat=5)) / number
+    print(f"{label:<28} {best * 1e6:10.1f} us")
+
+def main():
+    category_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pose_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f"{category_count} categories, {pose_count} poses each")
+
+    categories = make_library(category_count, pose_count)
+    increments = pose_count + 10
+
+    def relayout():
+        for category in categories:
+            category.frame = 0
+        core.layout(categories, 100, increments)
+
+    bench("layout", relayout, 100)
+
+    frames, indexes = core.frame_index(categories)
+    bench("frame_index", lambda: core.frame_index(categories), 100)
+
+    last = categories[-1].frame + pose_count - 1
+    bench("find_pose", lambda: core.find_pose(categories, frames, indexes, last, 1), 10000)
+
+    bench("plan_build ALL", lambda: core.plan_build(categories, 'ALL', 1), 10)
+    bench("plan_build CATEGORY", lambda: core.plan_build(categories, 'CATEGORY', 1, active_index=category_count // 2), 100)
+
+    data = core.write_template(categories, {}, {})
+    bench("write_template", lambda: core.write_template(categories, {}, {}), 10)
+    bench("read_template", lambda: core.read_template(data), 10)
+
+    names = [f"bone_{i}.{side}" for i in range(500) for side in "LR"]
+    bench("mirror_map (1000 bones)", lambda: core.mirror_map(names), 10)
+    bench("match_ignore (1000 bones)", lambda: core.match_ignore(names, [r"bone_1\d*\.L"]), 10)
+
+if __name__ == '__main__':
+    main()
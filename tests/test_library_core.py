@@ -0,0 +1,203 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT
+
+"""
+Tests for the template logic that doesn't need Blender.
+
+library_core is loaded from its file, since importing the add-on package
+would import bpy. Run with: python -m pytest tests
+
+The pytest.ini next to this file keeps pytest from importing the add-on
+package it sits in.
+"""
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_core():
+    spec = importlib.util.spec_from_file_location("library_core", os.path.join(ROOT, "library_core.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+core = load_core()
+
+
+def make_categories(poses_per_category=(3, 2, 4), start_frame=100, increments=100):
+    categories = []
+    for order, count in enumerate(poses_per_category):
+        poses = [core.Pose(f"pose {p}", uid=f"p{order}-{p}") for p in range(count)]
+        categories.append(core.Category(f"category {order}",
+            frame=core.category_frame(start_frame, increments, order),
+            order=order,
+            uid=f"c{order}",
+            poses=poses))
+    return categories
+
+
+# -------------------------------------------------------------------
+#   Layout
+# -------------------------------------------------------------------
+
+def test_layout_moves_only_misplaced_categories():
+    categories = make_categories()
+    categories[1].frame = 999
+    categories[2].order, categories[0].order = 0, 2
+
+    moved = core.layout(categories, 100, 100)
+
+    assert [category.frame for category in categories] == [300, 200, 100]
+    assert moved == [categories[0], categories[1], categories[2]]
+    assert core.layout(categories, 100, 100) == []
+
+def test_pose_frame():
+    category = make_categories()[1]
+    assert core.pose_frame(category, 0, 1) == 200
+    assert core.pose_frame(category, 3, 5) == 215
+
+
+# -------------------------------------------------------------------
+#   Finding poses
+# -------------------------------------------------------------------
+
+def test_find_pose():
+    categories = make_categories()
+    frames, indexes = core.frame_index(categories)
+
+    assert core.find_pose(categories, frames, indexes, 99, 1) == None
+    assert core.find_pose(categories, frames, indexes, 100, 1) == (0, 0)
+    assert core.find_pose(categories, frames, indexes, 102, 1) == (0, 2)
+    # past the last pose of a category
+    assert core.find_pose(categories, frames, indexes, 103, 1) == None
+    assert core.find_pose(categories, frames, indexes, 303, 1) == (2, 3)
+
+def test_find_pose_out_of_order():
+    categories = make_categories()
+    categories[0].frame, categories[2].frame = 300, 100
+    frames, indexes = core.frame_index(categories)
+
+    assert frames == [100, 200, 300]
+    assert core.find_pose(categories, frames, indexes, 101, 1) == (2, 1)
+    assert core.find_pose(categories, frames, indexes, 302, 1) == (0, 2)
+
+def test_find_pose_increments():
+    categories = make_categories()
+    frames, indexes = core.frame_index(categories)
+
+    assert core.find_pose(categories, frames, indexes, 205, 5) == (1, 1)
+    assert core.find_pose(categories, frames, indexes, 209, 5) == (1, 1)
+    assert core.find_pose(categories, frames, indexes, 210, 5) == None
+
+
+# -------------------------------------------------------------------
+#   Build planning
+# -------------------------------------------------------------------
+
+def test_parse_names():
+    assert core.parse_names(" face, hands ,,") == {"face", "hands"}
+
+def test_plan_build_all_leaves_out_skipped():
+    categories = make_categories()
+    categories[0].poses[1].skip = True
+
+    plan = core.plan_build(categories, 'ALL', 1)
+
+    assert len(plan) == 8
+    assert (0, 1, 101) not in plan
+    assert plan[:2] == [(0, 0, 100), (0, 2, 102)]
+
+@pytest.mark.parametrize("scope, expected", [
+    ('CATEGORY', [(1, 0, 200), (1, 1, 201)]),
+    ('POSE', [(1, 1, 201)]),
+    ('CATEGORIES', [(0, 0, 100), (0, 1, 101), (0, 2, 102), (2, 0, 300), (2, 1, 301), (2, 2, 302), (2, 3, 303)]),
+    ('FRAMES', [(0, 2, 102), (1, 0, 200)]),
+])
+def test_plan_build_scopes(scope, expected):
+    categories = make_categories()
+    categories[1].active_pose = 1
+
+    plan = core.plan_build(categories, scope, 1, active_index=1, names={"category 0", "category 2"},
+        frame_start=102, frame_end=200)
+
+    assert plan == expected
+
+def test_select_categories_reads_only_name_and_frame():
+    class Marker():
+        def __init__(self, name, frame):
+            self.name = name
+            self.frame = frame
+
+    markers = [Marker("a", 100), Marker("b", 200)]
+    assert [c for c, marker in core.select_categories(markers, 'FRAMES', frame_end=150)] == [0]
+
+
+# -------------------------------------------------------------------
+#   Controls
+# -------------------------------------------------------------------
+
+def test_match_ignore():
+    names = ["iris.L", "iris.R", "pupil.L", "jaw"]
+    assert core.match_ignore(names, ["iris.*", "jaw"]) == [0, 1, 3]
+    # patterns match the whole name
+    assert core.match_ignore(names, ["iris"]) == []
+
+def test_mirror_map():
+    names = ["hand.L", "hand.R", "spine", "L-foot", "R-foot", "arm_l.001", "arm_r.001", "ear.L"]
+    sides, mirror = core.mirror_map(names)
+
+    assert sides == ['L', 'R', None, 'L', 'R', 'L', 'R', 'L']
+    # ear.L has no match on the other side, so it mirrors onto itself
+    assert mirror == [1, 0, 2, 4, 3, 6, 5, 7]
+
+def test_mirror_pairs_leave_out_center_bones():
+    names = ["hand.L", "spine", "hand.R", "ear.L", "root"]
+    pairs = core.mirror_pairs(core.mirror_map(names)[1])
+
+    # spine and root are in the middle, and ear.L has no match, so none of them are flipped
+    assert pairs == {0: 2, 2: 0}
+
+
+# -------------------------------------------------------------------
+#   Template files
+# -------------------------------------------------------------------
+
+def test_template_round_trip():
+    with open(os.path.join(ROOT, "templates", "library.json")) as f:
+        data = json.load(f)
+
+    settings, categories = core.read_template(data)
+    written = core.write_template(categories, settings, data['info'])
+
+    assert written['info'] == data['info']
+    assert written['settings'] == data['settings']
+    fields = ('index', 'category', 'ignore', 'layers', 'mirror', 'camera', 'pose')
+    assert written['poses'] == [{field: entry[field] for field in fields} for entry in data['poses']]
+
+    # and once more from what was written
+    settings, categories = core.read_template(written)
+    assert core.write_template(categories, settings, data['info']) == written
+
+def test_read_template_defaults():
+    settings, categories = core.read_template({'poses': [{'category': "a"}, {'category': "b", 'mirror': None}]})
+
+    assert settings == {}
+    assert [category.frame for category in categories] == [100, 200]
+    assert categories[1].mirror == 'NONE'
+    assert categories[0].poses == []
+
+def test_write_template_sorts_by_order():
+    categories = make_categories()
+    categories[0].order, categories[2].order = 2, 0
+
+    written = core.write_template(categories, {'pose_increments': 2, 'unknown': 1}, {})
+
+    assert [entry['category'] for entry in written['poses']] == ["category 2", "category 1", "category 0"]
+    assert [entry['index'] for entry in written['poses']] == [0, 1, 2]
+    assert written['settings'] == {'pose_increments': 2}